@@ -1,14 +1,88 @@
-import pandas as pd
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel , Field 
+import asyncio
+import hmac
+import logging
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI , Request , HTTPException , Header
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel , Field , ValidationError
 from typing import Annotated , Optional,Literal
-from models.predict import model, MODEL_VERSION
+from models.predict import registry , get_model , LOCATIONS
+from models.batcher import MicroBatcher
+from models.cache import PredictionCache , PredictionGrid
+from common.response_cache import ResponseCache
+from common.bulk_body import parse_records
 
 
 
+# opt in micro batching for /predict , concurrent requests are collected for a few milliseconds and scored with one model call
+# it costs a little latency per request but gives much more throughput when the api is under load
+PREDICT_BATCHING=os.getenv('PREDICT_BATCHING','0') == '1'
+PREDICT_BATCH_MAX_SIZE=int(os.getenv('PREDICT_BATCH_MAX_SIZE','64'))
+PREDICT_BATCH_MAX_WAIT_MS=float(os.getenv('PREDICT_BATCH_MAX_WAIT_MS','2'))
+
+batcher=None
+
+# the same houses are asked about again and again so the predictions are cached (PREDICT_CACHE_SIZE=0 turns it off)
+# with PREDICT_GRID=1 every valid input is scored once at startup and /predict becomes a table lookup
+PREDICT_CACHE_SIZE=int(os.getenv('PREDICT_CACHE_SIZE','10000'))
+PREDICT_CACHE_TTL=float(os.getenv('PREDICT_CACHE_TTL','300'))
+PREDICT_GRID=os.getenv('PREDICT_GRID','0') == '1'
+
+cache=PredictionCache(PREDICT_CACHE_SIZE,PREDICT_CACHE_TTL) if PREDICT_CACHE_SIZE > 0 else None
+grid=None
+
+# a new model is rolled out by dropping lr_model-<version>.pkl into the models folder and calling /admin/reload
+# or by setting MODEL_WATCH_INTERVAL (seconds) so the folder is checked for new or replaced artifacts in the background
+# /admin/reload only exists when ADMIN_TOKEN is set , the caller has to send it in the X-Admin-Token header
+MODEL_WATCH_INTERVAL=float(os.getenv('MODEL_WATCH_INTERVAL','0'))
+ADMIN_TOKEN=os.getenv('ADMIN_TOKEN')
+
+logger=logging.getLogger(__name__)
+reload_lock=asyncio.Lock()
+watcher=None
+
+# with MODEL_MMAP=1 the prediction grid is saved as a .npy file next to the model artifact and memory mapped
+# so all the workers on a machine share one copy of it (the coefficients of this model are tiny , the grid is the big array)
+MODEL_MMAP=os.getenv('MODEL_MMAP','0') == '1'
+
+
+# /health is polled by load balancers and monitors many times a second , its answer is kept for HEALTH_CACHE_TTL seconds
+# and dropped at once when a new model is swapped in
+HEALTH_CACHE_TTL=float(os.getenv('HEALTH_CACHE_TTL','2'))
+response_cache=ResponseCache()
+
+
+# everything the api needs is set up here when the server starts and not when this module is imported
+# so importing app.py (for example in tests) does not touch the model files
+@asynccontextmanager
+async def lifespan(app:FastAPI):
+    global grid , watcher , batcher
+    loaded=await run_in_threadpool(get_model)
+    if PREDICT_GRID:
+        grid=await run_in_threadpool(build_grid,loaded)
+    if MODEL_WATCH_INTERVAL > 0:
+        watcher=asyncio.create_task(watch_models())
+    if PREDICT_BATCHING:
+        batcher=MicroBatcher(
+            lambda rows: get_model().predict_many(rows).tolist(),
+            max_batch_size=PREDICT_BATCH_MAX_SIZE,
+            max_wait_ms=PREDICT_BATCH_MAX_WAIT_MS
+        )
+        batcher.start()
+
+    yield
+
+    if batcher is not None:
+        await batcher.stop()
+    if watcher is not None:
+        watcher.cancel()
+
+
 # its good practice that we declare the model version also and generally we take the model version from the "MLflow" which is a special service
-app=FastAPI()
+# responses are written with orjson , it also writes numpy floats and arrays as they are so model outputs need no converting
+app=FastAPI(lifespan=lifespan,default_response_class=ORJSONResponse)
 
 # making a pydantic class to validate the data
 class price_prediction(BaseModel):
@@ -17,32 +91,154 @@ class price_prediction(BaseModel):
     location : Annotated[Literal['cityA','cityB','cityC'],Field(...,description='this is the location of the house',example='cityA')]
     age : Annotated[int,Field(...,description='this is the age of the house means how old the house is',example=12,lt=30,gt=5)]
 
+# every value that passes the validation above , used to build the prediction grid
+AREA_RANGE=range(501,2000)
+BEDROOMS_RANGE=range(2,6)
+AGE_RANGE=range(6,30)
+
 
 @app.get("/")
 def home():
     return {"message": "Welcome to the House Price Predictor ...This is the lastest House price predictor traind on the best AI models and the best real world data and hence its relaible and trust worthy"}
 
 
+def build_grid(loaded):
+    if MODEL_MMAP:
+        return PredictionGrid.load_or_build(
+            loaded.path.with_suffix('.grid.npy'),loaded.path,
+            loaded.predict_columns,loaded.version,AREA_RANGE,BEDROOMS_RANGE,LOCATIONS,AGE_RANGE
+        )
+    return PredictionGrid.build(loaded.predict_columns,loaded.version,AREA_RANGE,BEDROOMS_RANGE,LOCATIONS,AGE_RANGE)
+
+
+# loads (and warms up) the new model and its grid first , then swaps both in one go
+# requests that already started keep using the model they picked up so nothing is dropped during the swap
+async def activate_model(version:Optional[str]=None):
+    global grid
+    async with reload_lock:
+        loaded=await run_in_threadpool(registry.load,version)
+        new_grid=await run_in_threadpool(build_grid,loaded) if PREDICT_GRID else None
+        previous=registry.swap(loaded)
+        grid=new_grid
+        response_cache.invalidate('health')
+        return previous,loaded
+
+
+async def watch_models():
+    while True:
+        await asyncio.sleep(MODEL_WATCH_INTERVAL)
+        if registry.changed():
+            try:
+                await activate_model()
+            except Exception as e:
+                # a half copied artifact should not take the api down , the next change is picked up again
+                logger.warning('model reload failed : %r',e)
+
+
+@app.post('/admin/reload')
+async def reload_model(version:Optional[str]=None,x_admin_token:Optional[str]=Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404,detail='Not Found')
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode(),ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403,detail='invalid admin token')
+    try:
+        previous,loaded=await activate_model(version)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404,detail=str(e))
+    return {
+        'message':'model reloaded',
+        'previous version':previous.version if previous is not None else None,
+        'model':loaded.info()
+    }
+
+
 @app.post('/predict')
-def predict(data:price_prediction):
-    input_df=pd.DataFrame([{
-        'area':data.area,
-        'bedrooms':data.bedrooms,
-        'location':data.location,
-        'age':data.age
-    }])
-    prediction=model.predict(input_df)[0]
-    return JSONResponse(status_code=200,content={'predicted value is ':prediction}) 
+async def predict(data:price_prediction):
+    active=get_model()
+    prediction=None
+    if grid is not None and grid.version == active.version:
+        prediction=grid.lookup(data)
+
+    key=(active.version,data.area,data.bedrooms,data.location,data.age)
+    if prediction is None and cache is not None:
+        prediction=cache.get(key)
+
+    if prediction is None:
+        if batcher is not None:
+            prediction=await batcher.submit(data)
+        else:
+            prediction=await run_in_threadpool(active.predict_one,data)
+        if cache is not None:
+            cache.put(key,prediction)
+
+    return ORJSONResponse(status_code=200,content={'predicted value is ':prediction})
+
+
+# batch scoring , the client sends many houses in one request (a json array or NDJSON , one json object per line) and all the valid ones are scored with a single model.predict call
+MAX_BATCH_SIZE=10_000
+
+
+def score_batch(records:list):
+    active=get_model()
+    valid=[]
+    positions=[]
+    errors=[]
+    for i,record in enumerate(records):
+        if isinstance(record,ValueError):
+            errors.append({'index':i,'errors':[{'type':'json_invalid','msg':str(record)}]})
+            continue
+        try:
+            valid.append(price_prediction.model_validate(record))
+            positions.append(i)
+        except ValidationError as e:
+            errors.append({'index':i,'errors':e.errors(include_url=False,include_context=False)})
+
+    # the rows that failed the validation keep a None so the predictions stay in the same order as the input
+    # when every row is valid the numpy array from the model is returned as it is , orjson writes it without a python list in between
+    if valid and not errors:
+        predictions=active.predict_many(valid)
+    else:
+        predictions=[None]*len(records)
+        if valid:
+            for i,value in zip(positions,active.predict_many(valid).tolist()):
+                predictions[i]=value
+
+    return {
+        'model version':active.version,
+        'count':len(records),
+        'predictions':predictions,
+        'errors':errors
+    }
+
+
+@app.post('/predict/batch')
+async def predict_batch(request:Request):
+    records=parse_records(await request.body(),request.headers.get('content-type',''),'houses')
+    if len(records) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413,detail=f'a batch can have at most {MAX_BATCH_SIZE} houses')
+
+    # validation and the model call are cpu work so they run in the threadpool and do not block the event loop
+    # the result is handed to orjson directly , jsonable_encoder would not know what to do with the numpy array
+    return ORJSONResponse(await run_in_threadpool(score_batch,records))
 
 
 
 # its often a very good idea to add a health check end point that tells about the current status of our API and it later helps us in telling AWS etc that the API we are going to deploy is not having any issues.
 
 @app.get('/health')
+@response_cache.cached(ttl=HEALTH_CACHE_TTL,tags=('health',))
 def health_check():
+    # the health check only reports , it does not load the model
+    active=registry.active
     return {
         'status':'OK',
-        'model version':MODEL_VERSION,
-        'model loaded': model is not None
+        'model version':active.version if active is not None else None,
+        'model loaded': active is not None,
+        'model':active.info() if active is not None else None,
+        'available versions':registry.versions(),
+        'batching': batcher.stats() if batcher is not None else {'enabled':False},
+        'cache': cache.stats() if cache is not None else {'enabled':False},
+        'grid': grid.stats() if grid is not None else {'enabled':False},
+        'response cache': response_cache.stats()
     }
 
@@ -0,0 +1,126 @@
+import argparse
+import asyncio
+import random
+import time
+from collections import namedtuple
+import numpy as np
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+from post_upload_project.schemas import PostOut , PostOutList , model_response
+
+# micro benchmark of the response serialization :  python bench_serialization.py [--repeat 200]
+# every endpoint is mounted twice in a bare FastAPI app , once the old way and once the way it is written now ,
+# and called straight through ASGI (no server , no client) with the biggest payload it can return
+#   /students      : 1000 student dicts , jsonable_encoder + JSONResponse  vs  ORJSONResponse
+#   /myPosts       : 500 rows , response_model=list[PostOut]  vs  model_response(PostOutList , rows)
+#   /predict/batch : 10000 predictions , .tolist() through the default JSONResponse  vs  the numpy array through ORJSONResponse
+
+CITIES = ["Mansehra" , "Abbottabad" , "Peshawar" , "Islamabad" , "Lahore"]
+
+
+Row = namedtuple("Row" , "id author_id content")      # stands in for the SQLAlchemy Row , it has the attributes and _asdict()
+
+
+def students(count : int) -> list:
+    return [
+        {"id" : i , "name" : f"student {i:05d}" , "age" : random.randint(6 , 29) , "city" : random.choice(CITIES) ,
+         "gender" : random.choice(["male" , "female" , "other"]) , "grade" : random.choice("ABCDF")}
+        for i in range(count)
+    ]
+
+
+def posts(count : int) -> list:
+    return [Row(i , 7 , f"post number {i} , " + "some words of content " * 8) for i in range(count)]
+
+
+def batch_result(count : int) -> dict:
+    return {"model version" : "1.0.0" , "count" : count , "predictions" : np.random.rand(count) * 1e6 , "errors" : []}
+
+
+def endpoint_pairs() -> list:
+    student_page = students(1000)
+    post_rows = posts(500)
+    predictions = batch_result(10_000)
+
+    old , new = FastAPI() , FastAPI(default_response_class=ORJSONResponse)
+
+    @old.get("/students")
+    def old_students():
+        return student_page
+
+    @new.get("/students")
+    def new_students():
+        return ORJSONResponse(student_page)
+
+    @old.get("/myPosts" , response_model=list[PostOut])
+    def old_posts():
+        return [row._asdict() for row in post_rows]
+
+    @new.get("/myPosts" , response_model=list[PostOut])
+    def new_posts():
+        return model_response(PostOutList , post_rows)
+
+    @old.get("/predict/batch")
+    def old_batch():
+        return {**predictions , "predictions" : predictions["predictions"].tolist()}
+
+    @new.get("/predict/batch")
+    def new_batch():
+        return ORJSONResponse(predictions)
+
+    return [(path , old , new) for path in ("/students" , "/myPosts" , "/predict/batch")]
+
+
+async def call(app , path : str) -> bytes:
+    scope = {
+        "type" : "http" , "asgi" : {"version" : "3.0"} , "http_version" : "1.1" , "method" : "GET" , "scheme" : "http" ,
+        "path" : path , "raw_path" : path.encode() , "root_path" : "" , "query_string" : b"" , "headers" : [] ,
+        "client" : ("bench" , 1) , "server" : ("bench" , 80) ,
+    }
+    body = []
+
+    async def receive():
+        return {"type" : "http.request" , "body" : b"" , "more_body" : False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            body.append(message.get("body" , b""))
+
+    await app(scope , receive , send)
+    return b"".join(body)
+
+
+async def per_call_ms(app , path : str , repeat : int) -> float:
+    for _ in range(5):
+        await call(app , path)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await call(app , path)
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+async def main(repeat : int) -> list:
+    rows = []
+    for path , old , new in endpoint_pairs():
+        old_ms = await per_call_ms(old , path , repeat)
+        new_ms = await per_call_ms(new , path , repeat)
+        rows.append({
+            "endpoint" : path ,
+            "bytes" : len(await call(new , path)) ,
+            "old ms" : round(old_ms , 3) ,
+            "new ms" : round(new_ms , 3) ,
+            "speedup" : f"{old_ms / new_ms:.1f}x" ,
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="compare the old and the new response serialization per endpoint")
+    parser.add_argument("--repeat" , type=int , default=200)
+    args = parser.parse_args()
+
+    rows = asyncio.run(main(args.repeat))
+    columns = list(rows[0])
+    print("  ".join(f"{c:>14}" for c in columns))
+    for row in rows:
+        print("  ".join(f"{row[c]!s:>14}" for c in columns))
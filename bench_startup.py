@@ -0,0 +1,143 @@
+import argparse
+import json
+import os
+import pickle
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# startup benchmark for the model loading of app.py :  python bench_startup.py [--workers 4]
+# every scenario runs in a fresh master process that forks the workers the way `gunicorn -w N` does ,
+# a worker is booted once it has served its first prediction , then the memory of every worker is read while all of them are alive
+#   import-time unpickle : the old models/predict.py , every worker imports the app and unpickles its own copy of the model
+#   lazy get_model()     : every worker imports the app (no file is touched) and loads the model cold on first use
+#   MODEL_PRELOAD=1      : the master loads the model once , the forked workers share its pages copy on write
+#   + PREDICT_GRID=1     : on top of the preload every worker builds its own prediction grid
+#   + MODEL_MMAP=1       : the same grid read from the .npy sidecar , memory mapped and shared through the page cache
+# the model files are copied to a temporary MODEL_DIR so the sidecar is never written into the repo
+# RSS counts the shared pages in full for every worker , PSS splits them between the processes sharing them (linux only)
+
+SCENARIOS = {
+    "import-time unpickle" : {} ,
+    "lazy get_model()" : {} ,
+    "MODEL_PRELOAD=1" : {"MODEL_PRELOAD" : "1"} ,
+    "+ PREDICT_GRID=1" : {"MODEL_PRELOAD" : "1" , "PREDICT_GRID" : "1"} ,
+    "+ MODEL_MMAP=1" : {"MODEL_PRELOAD" : "1" , "PREDICT_GRID" : "1" , "MODEL_MMAP" : "1"} ,
+}
+
+
+def memory_mb(pid : int) -> dict:
+    values = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name , _ , rest = line.partition(":")
+                if name in ("Rss" , "Pss"):
+                    values[name] = int(rest.split()[0]) / 1024
+    except OSError:
+        pass
+    return values
+
+
+def boot(scenario : str) -> float:
+    # runs in a freshly forked worker , returns the seconds spent loading the model and the grid
+    import app
+    from models.predict import get_model , MODEL_DIR , FEATURES , WARMUP_ROW
+    from types import SimpleNamespace
+    started = time.perf_counter()
+    if scenario == "import-time unpickle":
+        import pandas as pd
+        with open(MODEL_DIR / "lr_model.pkl" , "rb") as f:
+            model = pickle.load(f)
+        model.predict(pd.DataFrame([WARMUP_ROW] , columns=FEATURES))
+        return time.perf_counter() - started
+
+    loaded = get_model()
+    if app.PREDICT_GRID:
+        app.grid = app.build_grid(loaded)
+        app.grid.lookup(SimpleNamespace(**WARMUP_ROW))
+    else:
+        loaded.predict_one(SimpleNamespace(**WARMUP_ROW))
+    return time.perf_counter() - started
+
+
+def master(scenario : str , workers : int):
+    started = time.perf_counter()
+    if os.getenv("MODEL_PRELOAD") == "1":
+        import app
+        from models.predict import get_model
+        if app.MODEL_MMAP:
+            # the sidecar is written by the first boot , the workers measured here find it ready like on every later boot
+            app.build_grid(get_model())
+    master_seconds = time.perf_counter() - started
+
+    reports_r , reports_w = os.pipe()
+    release_r , release_w = os.pipe()
+    pids = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            forked = time.perf_counter()
+            model_seconds = boot(scenario)
+            os.write(reports_w , f"{time.perf_counter() - forked} {model_seconds}\n".encode())
+            os.read(release_r , 1)
+            os._exit(0)
+        pids.append(pid)
+
+    reports = b""
+    while reports.count(b"\n") < workers:
+        reports += os.read(reports_r , 4096)
+    times = [tuple(map(float , line.split())) for line in reports.decode().splitlines()]
+    memory = [memory_mb(pid) for pid in pids]
+    master_memory = memory_mb(os.getpid())
+
+    os.write(release_w , b"x" * workers)
+    for pid in pids:
+        os.waitpid(pid , 0)
+
+    def mean(values):
+        return sum(values) / len(values) if values else 0.0
+
+    print(json.dumps({
+        "scenario" : scenario ,
+        "master s" : round(master_seconds , 3) ,
+        "worker boot s" : round(mean([t[0] for t in times]) , 3) ,
+        "model s" : round(mean([t[1] for t in times]) , 3) ,
+        "worker RSS MB" : round(mean([m.get("Rss" , 0) for m in memory]) , 1) ,
+        "worker PSS MB" : round(mean([m.get("Pss" , 0) for m in memory]) , 1) ,
+        "total PSS MB" : round(sum(m.get("Pss" , 0) for m in memory + [master_memory]) , 1) ,
+    }))
+
+
+def run(scenario : str , workers : int , model_dir : Path) -> dict:
+    env = {k : v for k , v in os.environ.items() if k not in ("MODEL_PRELOAD" , "PREDICT_GRID" , "MODEL_MMAP")}
+    env.update(SCENARIOS[scenario] , MODEL_DIR=str(model_dir))
+    output = subprocess.run(
+        [sys.executable , __file__ , "--scenario" , scenario , "--workers" , str(workers)] ,
+        env=env , cwd=Path(__file__).parent , capture_output=True , text=True , check=True ,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="compare the worker boot time and memory of the model loading modes")
+    parser.add_argument("--workers" , type=int , default=4)
+    parser.add_argument("--scenario" , choices=list(SCENARIOS) , help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario:
+        master(args.scenario , args.workers)
+        sys.exit()
+
+    with tempfile.TemporaryDirectory() as folder:
+        for artifact in (Path(__file__).parent / "models").glob("*.pkl"):
+            shutil.copy2(artifact , folder)
+        rows = [run(scenario , args.workers , Path(folder)) for scenario in SCENARIOS]
+
+    columns = list(rows[0])
+    print("  ".join(f"{c:>20}" if i == 0 else f"{c:>14}" for i , c in enumerate(columns)))
+    for row in rows:
+        print("  ".join(f"{row[c]!s:>20}" if i == 0 else f"{row[c]!s:>14}" for i , c in enumerate(columns)))
@@ -0,0 +1,31 @@
+import orjson
+from fastapi import HTTPException
+
+# the request bodies of the bulk endpoints : a json array or NDJSON (one json object per line)
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+def media_type(content_type: str) -> str:
+    return content_type.split(";")[0].strip()
+
+
+def parse_records(body: bytes, content_type: str, noun: str = "records") -> list:
+    # returns a list of records , an NDJSON line that is not valid json is kept as the exception so it gets reported against its own row
+    if media_type(content_type) in NDJSON_TYPES:
+        records = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                records.append(orjson.loads(line))
+            except ValueError as e:
+                records.append(e)
+        return records
+
+    try:
+        records = orjson.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="request body is not valid json")
+    if not isinstance(records, list):
+        raise HTTPException(status_code=400, detail=f"expected a json array of {noun}")
+    return records
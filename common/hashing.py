@@ -0,0 +1,90 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+# bcrypt takes 100-300 ms of cpu for every hash or verify , done in the request it blocks the server for everyone else
+# so /signup , /register and /login hand it to a pool of separate processes (threads would still fight over the GIL)
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", os.cpu_count() or 2))
+# how many operations may wait for a free worker , after that new ones are refused with 429 instead of piling up
+HASH_QUEUE_SIZE = int(os.getenv("HASH_QUEUE_SIZE", "64"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+# these run inside the worker processes
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+class HashingService:
+
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.executor = None
+        self.in_flight = 0
+
+        # metrics
+        self.completed = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        # the processes are only started when the first password is hashed
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self.executor
+
+    async def _run(self, fn, *args):
+        if self.in_flight >= self.workers + self.queue_size:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="too many password checks in progress , try again shortly",
+                headers={"Retry-After": "1"},
+            )
+
+        self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor(), fn, *args)
+        finally:
+            self.in_flight -= 1
+            elapsed = time.perf_counter() - started
+            self.completed += 1
+            self.total_seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(_verify, plain_password, hashed_password)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "in flight": self.in_flight,
+            "queue depth": max(0, self.in_flight - self.workers),
+            "queue size": self.queue_size,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg ms": round(self.total_seconds / self.completed * 1000, 2) if self.completed else 0.0,
+            "max ms": round(self.max_seconds * 1000, 2),
+        }
+
+
+hasher = HashingService(HASH_WORKERS, HASH_QUEUE_SIZE)
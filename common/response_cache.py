@@ -0,0 +1,213 @@
+import asyncio
+import inspect
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from functools import wraps
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse, Response
+
+# whole responses of hot GET endpoints are kept in memory , already serialized , so a hit costs no work at all
+# the key is the path together with the sorted query parameters , RESPONSE_CACHE_MAX_BYTES bounds the memory it may use
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "30"))
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    status_code: int
+    body: bytes
+    headers: tuple            # (name , value) pairs without content-length
+    tags: tuple
+    expires_at: float
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(k) + len(v) for k, v in self.headers)
+
+    def etag(self):
+        for name, value in self.headers:
+            if name == "etag":
+                return value
+        return None
+
+    def to_response(self, if_none_match: str = None) -> Response:
+        # a client that already has this body (its If-None-Match matches our ETag) gets an empty 304
+        etag = self.etag()
+        if etag and if_none_match and etag.removeprefix("W/") in {t.strip().removeprefix("W/") for t in if_none_match.split(",")}:
+            return Response(status_code=304, headers={k: v for k, v in self.headers if k != "content-type"})
+        return Response(content=self.body, status_code=self.status_code, headers=dict(self.headers))
+
+
+# an LRU bounded by the bytes of the bodies it holds , with a time to live per route and invalidation by tag
+# identical misses that arrive together are coalesced (single flight) , the endpoint runs once and every waiting request gets its result
+class ResponseCache:
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_MAX_BYTES, default_ttl: float = RESPONSE_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.entries = OrderedDict()           # key -> CachedResponse
+        self.keys_by_tag = defaultdict(set)    # tag -> keys of the entries that carry it
+        self.inflight = {}                     # (key , If-None-Match) -> task computing it , only touched from the event loop
+        self.lock = threading.Lock()           # invalidation can come from the threadpool
+        self.generation = 0                    # bumped by every invalidation , a result computed across one is not stored
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(request: Request) -> str:
+        query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+        return f"{request.url.path}?{query}"
+
+    def get(self, key: str):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at < now:
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, entry: CachedResponse, generation: int):
+        if entry.size > self.max_bytes:
+            return
+        with self.lock:
+            if generation != self.generation:
+                return
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = entry
+            self.bytes += entry.size
+            for tag in entry.tags:
+                self.keys_by_tag[tag].add(key)
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def _remove(self, key: str):
+        entry = self.entries.pop(key)
+        self.bytes -= entry.size
+        for tag in entry.tags:
+            keys = self.keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.keys_by_tag[tag]
+
+    def invalidate(self, *tags: str):
+        # call this from whatever changes the data behind the cached responses , with the tags those routes were given
+        with self.lock:
+            self.generation += 1
+            self.invalidations += 1
+            for tag in tags:
+                for key in list(self.keys_by_tag.get(tag, ())):
+                    self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+            self.keys_by_tag.clear()
+            self.bytes = 0
+
+    def cached(self, ttl: float = None, tags: tuple = ()):
+        # decorator for a GET endpoint , put it under the @app.get line
+        # tags are format strings filled in with the endpoint's arguments , for example "student:{student_id}"
+        # only 200 responses are stored , errors (HTTPException) are raised to every waiting request and never cached
+        # the endpoint's return value is serialized here , so response_model filtering does not apply to cached routes
+        ttl = self.default_ttl if ttl is None else ttl
+
+        def decorator(endpoint):
+            signature = inspect.signature(endpoint)
+            request_param = next((p.name for p in signature.parameters.values() if p.annotation is Request), None)
+            if request_param is None:
+                # the wrapper needs the request for the key , it is added to the signature FastAPI sees but not passed on
+                request_param = "_cache_request"
+                signature = signature.replace(parameters=[
+                    *signature.parameters.values(),
+                    inspect.Parameter(request_param, inspect.Parameter.KEYWORD_ONLY, annotation=Request),
+                ])
+                pass_request = False
+            else:
+                pass_request = True
+            is_async = inspect.iscoroutinefunction(endpoint)
+
+            async def compute(kwargs, route_tags):
+                generation = self.generation
+                if is_async:
+                    result = await endpoint(**kwargs)
+                else:
+                    result = await run_in_threadpool(endpoint, **kwargs)
+                return generation, self.freeze(result, route_tags, ttl)
+
+            @wraps(endpoint)
+            async def wrapper(**kwargs):
+                request = kwargs[request_param] if pass_request else kwargs.pop(request_param)
+                key = self.make_key(request)
+                entry = self.get(key)
+                if entry is not None:
+                    self.hits += 1
+                    return entry.to_response(request.headers.get("if-none-match"))
+
+                # the If-None-Match is part of the in flight key , an endpoint may answer a conditional request with a 304
+                # and that must not be handed to a request that did not ask conditionally
+                flight = (key, request.headers.get("if-none-match"))
+                task = self.inflight.get(flight)
+                if task is None:
+                    self.misses += 1
+                    route_tags = tuple(tag.format(**kwargs) for tag in tags)
+                    task = asyncio.ensure_future(compute(kwargs, route_tags))
+                    self.inflight[flight] = task
+                    task.add_done_callback(lambda t: self._finish(flight, t))
+                else:
+                    self.coalesced += 1
+                # shielded so a client that goes away does not cancel the work the other waiting requests need
+                generation, entry = await asyncio.shield(task)
+                return entry.to_response(request.headers.get("if-none-match"))
+
+            wrapper.__signature__ = signature
+            return wrapper
+        return decorator
+
+    def _finish(self, flight, task):
+        self.inflight.pop(flight, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        generation, entry = task.result()
+        if entry.status_code == 200:
+            self.put(flight[0], entry, generation)
+
+    @staticmethod
+    def freeze(result, tags: tuple, ttl: float) -> CachedResponse:
+        if not isinstance(result, Response):
+            result = ORJSONResponse(jsonable_encoder(result))
+        if not hasattr(result, "body"):
+            raise TypeError("streaming responses can not be cached")
+        headers = tuple((k.decode("latin-1"), v.decode("latin-1")) for k, v in result.raw_headers if k != b"content-length")
+        return CachedResponse(result.status_code, bytes(result.body), headers, tags, time.monotonic() + ttl)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "enabled": True,
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "max bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit ratio": round((self.hits + self.coalesced) / (total + self.coalesced), 4) if total else 0.0,
+        }
@@ -0,0 +1,179 @@
+import contextvars
+import heapq
+import hmac
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from functools import wraps
+from typing import Optional
+from fastapi import FastAPI, Header, HTTPException, Request
+from sqlalchemy import event
+
+# light weight SQL profiling instead of echo=True , every statement is timed and counted against the request that ran it
+# the totals go out in a Server-Timing header (browser dev tools show it) and statements slower than SQL_SLOW_QUERY_MS are logged ,
+# SQL_SLOW_QUERY_SAMPLE_RATE of them (1.0 = all)
+# it is off unless SQL_PROFILING=1 , and /debug/sql only answers when SQL_DEBUG_TOKEN is set and sent in the X-Admin-Token header
+# (the recent statements and timings say a lot about the schema and the traffic)
+SQL_PROFILING = os.getenv("SQL_PROFILING", "0") == "1"
+SQL_SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "100"))
+SQL_SLOW_QUERY_SAMPLE_RATE = float(os.getenv("SQL_SLOW_QUERY_SAMPLE_RATE", "1.0"))
+SQL_DEBUG_TOKEN = os.getenv("SQL_DEBUG_TOKEN")
+
+logger = logging.getLogger("sql.slow")
+_order = itertools.count()
+
+
+# what one request did in the database
+class RequestStats:
+    KEEP_SLOWEST = 5
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.slowest = []          # min heap of (ms , n , query) , the query is only turned into text when it is shown
+
+    def record(self, query, ms: float):
+        self.count += 1
+        self.total_ms += ms
+        entry = (ms, next(_order), query)
+        if len(self.slowest) < self.KEEP_SLOWEST:
+            heapq.heappush(self.slowest, entry)
+        elif ms > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, entry)
+
+    def summary(self) -> dict:
+        return {
+            "statements": self.count,
+            "db ms": round(self.total_ms, 3),
+            "slowest": [{"ms": round(ms, 3), "statement": str(q)} for ms, _, q in sorted(self.slowest, reverse=True)],
+        }
+
+
+# set by the middleware for every request , whatever times a statement adds to the stats object that is current
+# the object is shared with the threadpool and the async driver because they run in a copy of this context
+current_stats = contextvars.ContextVar("sql_request_stats", default=None)
+
+
+# the part that does not depend on where the statements come from , the subclasses only add instrument()
+class SqlProfiler:
+
+    def __init__(self, slow_ms: float = SQL_SLOW_QUERY_MS, sample_rate: float = SQL_SLOW_QUERY_SAMPLE_RATE, keep_requests: int = 100):
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+        self.recent = deque(maxlen=keep_requests)   # summaries of the last requests for the debug endpoint
+        self.lock = threading.Lock()
+        self.statements = 0
+        self.total_ms = 0.0
+        self.slow_logged = 0
+
+    def record(self, query, ms: float):
+        stats = current_stats.get()
+        if stats is not None:
+            stats.record(query, ms)
+        with self.lock:
+            self.statements += 1
+            self.total_ms += ms
+        if ms >= self.slow_ms and random.random() < self.sample_rate:
+            self.slow_logged += 1
+            # only the statement , the parameters can hold passwords and tokens
+            logger.warning("slow query %.1f ms : %s", ms, query)
+
+    def install(self, app: FastAPI, debug_path: str = "/debug/sql"):
+        @app.middleware("http")
+        async def profile_sql(request: Request, call_next):
+            stats = RequestStats()
+            token = current_stats.set(stats)
+            try:
+                response = await call_next(request)
+            finally:
+                current_stats.reset(token)
+            response.headers["Server-Timing"] = f'db;dur={stats.total_ms:.3f};desc="{stats.count} queries"'
+            self.recent.append({"method": request.method, "path": request.url.path, **stats.summary()})
+            return response
+
+        @app.get(debug_path, include_in_schema=False)
+        def sql_debug(x_admin_token: Optional[str] = Header(None)):
+            if not SQL_DEBUG_TOKEN:
+                raise HTTPException(status_code=404, detail="Not Found")
+            if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode(), SQL_DEBUG_TOKEN.encode()):
+                raise HTTPException(status_code=403, detail="invalid admin token")
+            return self.report()
+
+    def report(self) -> dict:
+        recent = list(self.recent)
+        return {
+            "statements": self.statements,
+            "db ms": round(self.total_ms, 3),
+            "slow query ms": self.slow_ms,
+            "slow queries logged": self.slow_logged,
+            "busiest recent requests": sorted(recent, key=lambda r: r["db ms"], reverse=True)[:10],
+            "recent requests": recent[-20:],
+        }
+
+
+# for a SQLAlchemy engine , every statement is timed with the cursor events
+class EngineProfiler(SqlProfiler):
+
+    def instrument(self, engine):
+        # for an AsyncEngine pass engine.sync_engine , the events only exist on the sync side
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+        event.listen(engine, "handle_error", self._failed)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        self.record(statement, (time.perf_counter() - conn.info["query_started"].pop()) * 1000)
+
+    def _failed(self, exception_context):
+        # a statement that raised never reaches after_cursor_execute , its start time is dropped here
+        # or it would stay on the connection and the next statement would be timed against it
+        conn = exception_context.connection
+        if conn is not None and exception_context.execution_context is not None and conn.info.get("query_started"):
+            conn.info["query_started"].pop()
+
+
+# for the `databases` library , the queries do not go through a SQLAlchemy engine so there are no cursor events to listen to
+# instead the Database methods are wrapped and timed
+class DatabaseProfiler(SqlProfiler):
+    TIMED = ("execute", "execute_many", "fetch_all", "fetch_one", "fetch_val")
+
+    def instrument(self, database):
+        for name in self.TIMED:
+            setattr(database, name, self._timed(getattr(database, name)))
+        database.iterate = self._timed_iterate(database.iterate)
+
+    def _timed(self, method):
+        @wraps(method)
+        async def timed(query, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await method(query, *args, **kwargs)
+            finally:
+                self.record(query, (time.perf_counter() - started) * 1000)
+        return timed
+
+    def _timed_iterate(self, method):
+        # only the time spent waiting on the cursor is counted , not the time the caller spends on each row
+        @wraps(method)
+        async def timed(query, *args, **kwargs):
+            waited = 0.0
+            rows = method(query, *args, **kwargs).__aiter__()
+            try:
+                while True:
+                    started = time.perf_counter()
+                    try:
+                        row = await rows.__anext__()
+                    except StopAsyncIteration:
+                        break
+                    finally:
+                        waited += time.perf_counter() - started
+                    yield row
+            finally:
+                self.record(query, waited * 1000)
+        return timed
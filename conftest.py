@@ -0,0 +1,2 @@
+# the apps are packages of the repo root (learn_jwt.main , post_upload_project.main ...) ,
+# pytest puts the folder of this file on sys.path so plain `pytest` finds them like `python -m pytest` does
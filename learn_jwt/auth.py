@@ -1,18 +1,18 @@
 from fastapi.security import OAuth2PasswordBearer 
-from passlib.context import CryptContext
 from typing import Optional
-from schemas import UserinDB , TokenData
-from database import fake_users_db
+from .schemas import UserinDB , TokenData
+from .database import fake_users_db
 from datetime import timedelta ,datetime
 from jose import JWTError , jwt
 from fastapi import Depends , status , HTTPException
+from pydantic import ValidationError
+from common.hashing import hasher
+from .token_cache import token_cache , verify_jwt
 
 SECRAT_KEY="asdjkxrgsenfgedfxb"
 ALGORITHM="HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES=20
 
-pwd_context=CryptContext(schemes=["bcrypt"],deprecated="auto")
-
 oauth2_scheme=OAuth2PasswordBearer(tokenUrl="login")
 
 
@@ -22,18 +22,19 @@ def get_user(username:str) -> Optional[UserinDB]:
         return UserinDB(**user_dict)
     return None
 
-def verify_password(plain_password:str,hashed_password:str) -> bool:
-    return pwd_context.verify(plain_password,hashed_password)
+# both go through the hashing process pool so the event loop is free while bcrypt runs
+async def verify_password(plain_password:str,hashed_password:str) -> bool:
+    return await hasher.verify(plain_password,hashed_password)
 
 
-def get_hash_password(plain_password:str):
-    return pwd_context.hash(plain_password)
+async def get_hash_password(plain_password:str):
+    return await hasher.hash(plain_password)
 
-def authenticate_user(user_name,password):
+async def authenticate_user(user_name,password):
     user=get_user(user_name)
     if not user:
         return False
-    if not verify_password(password,user.hashed_password):
+    if not await verify_password(password,user.hashed_password):
         return False
     return user
 
@@ -56,8 +57,13 @@ def get_current_user(token:str=Depends(oauth2_scheme)) -> UserinDB:
         headers={"WWW-Authenticate":"Bearer"}
     )
     
+    # a token that was verified before is answered from the cache without checking the signature again
+    cached=token_cache.get(token)
+    if cached is not None:
+        return cached[1]
+
     try:
-        payload=jwt.decode(token,SECRAT_KEY,algorithms=[ALGORITHM])
+        payload=verify_jwt(token,SECRAT_KEY,ALGORITHM)
         username:str=payload.get("sub")
 
         if username is None:
@@ -65,7 +71,8 @@ def get_current_user(token:str=Depends(oauth2_scheme)) -> UserinDB:
 
         token_data=TokenData(username=username)
     
-    except JWTError:
+    except (JWTError , ValidationError):
+        # a token that can not be decoded or whose claims make no sense is a bad credential , never a server error
         raise credintials_exceptions
     
     user=get_user(token_data.username)
@@ -73,6 +80,7 @@ def get_current_user(token:str=Depends(oauth2_scheme)) -> UserinDB:
     if user is None:
         raise credintials_exceptions
     
+    token_cache.put(token,payload,user)
     return user
 
 def get_current_active_user(current_user:UserinDB=Depends(get_current_user)) -> UserinDB:
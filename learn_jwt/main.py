@@ -1,29 +1,38 @@
-from pydantic import BaseModel
-from schemas import User , Create_user
+# started from the repo root :  uvicorn learn_jwt.main:app --reload
+from .schemas import User , Create_user
 from fastapi import FastAPI , HTTPException , Depends
+from fastapi.responses import ORJSONResponse
 from typing import Optional 
-from database import fake_users_db
-from auth import get_hash_password ,authenticate_user ,create_access_token,get_current_active_user
-from fastapi.security import OAuth2PasswordRequestForm , OAuth2PasswordBearer
+from .database import fake_users_db
+from .auth import get_hash_password ,authenticate_user ,create_access_token,get_current_active_user
+from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta
+from common.hashing import hasher
+from .token_cache import token_cache
 
 
-app=FastAPI()
+app=FastAPI(default_response_class=ORJSONResponse)
+
+@app.on_event("shutdown")
+def stop_hashing():
+    hasher.shutdown()
 
 @app.get("/health")
 def health():
     return{
         "health":"ok",
-        "is everything working fine":True
+        "is everything working fine":True,
+        "password hashing":hasher.stats(),
+        "token cache":token_cache.stats()
     }
 
 
 @app.post("/signup",response_model=User ,status_code=200)
-def signup(user: Create_user) -> Optional[Create_user]:
+async def signup(user: Create_user) -> Optional[Create_user]:
     if user.username in fake_users_db:
         raise HTTPException(status_code=401 , detail="user already exists")
     
-    hashed_password=get_hash_password(user.password)
+    hashed_password=await get_hash_password(user.password)
     new_user_id=len(fake_users_db)+101
     fake_users_db[user.username]={
         "user_id":new_user_id,
@@ -40,8 +49,8 @@ def signup(user: Create_user) -> Optional[Create_user]:
 
 
 @app.post("/login")
-def login(form_data:OAuth2PasswordRequestForm=Depends()):
-    user=authenticate_user(form_data.username,form_data.password)
+async def login(form_data:OAuth2PasswordRequestForm=Depends()):
+    user=await authenticate_user(form_data.username,form_data.password)
     if not user:
         raise HTTPException(status_code=401,detail="invalid username or password")
     access_token_expires=timedelta(minutes=20)
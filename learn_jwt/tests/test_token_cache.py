@@ -0,0 +1,103 @@
+import base64
+import json
+import time
+from datetime import timedelta
+import pytest
+from fastapi.testclient import TestClient
+from jose import JWTError, jwt
+from learn_jwt import auth
+from learn_jwt.main import app
+from learn_jwt.token_cache import VERIFIERS, TokenCache, token_cache
+
+KEY = auth.SECRAT_KEY
+
+# every test runs with both verifier backends , they have to accept and refuse exactly the same tokens
+backends = pytest.mark.parametrize("backend", sorted(VERIFIERS))
+
+
+def segment(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).rstrip(b"=").decode()
+
+
+MALFORMED_TOKENS = [
+    "",
+    "abc",
+    "a.b",
+    "a.b.c.d",
+    "W10.W10.AAAA",                 # both parts decode to a json array
+    "MQ.MQ.AAAA",                   # both parts decode to the number 1
+    f"{segment({'alg': 'HS256'})}.W10.AAAA",
+    f"W10.{segment({'sub': 'usman'})}.AAAA",
+    "!!!.@@@.###",
+    "é.é.é",
+    f"{segment({'alg': 'HS256'})}.bm90IGpzb24.AAAA",     # the payload is not json
+]
+
+
+@pytest.fixture
+def client(monkeypatch, request):
+    monkeypatch.setattr(auth, "verify_jwt", VERIFIERS[request.param])
+    token_cache.clear()
+    yield TestClient(app)
+    token_cache.clear()
+
+
+@backends
+def test_valid_token_gives_the_claims(backend):
+    token = auth.create_access_token({"sub": "usman"}, timedelta(minutes=5))
+    assert VERIFIERS[backend](token, KEY, "HS256")["sub"] == "usman"
+
+
+@backends
+def test_expired_token_is_refused(backend):
+    token = jwt.encode({"sub": "usman", "exp": int(time.time()) - 10}, KEY, algorithm="HS256")
+    with pytest.raises(JWTError):
+        VERIFIERS[backend](token, KEY, "HS256")
+
+
+@backends
+def test_wrong_key_or_algorithm_is_refused(backend):
+    for token in (
+        jwt.encode({"sub": "usman"}, "some other key", algorithm="HS256"),
+        jwt.encode({"sub": "usman"}, KEY, algorithm="HS512"),
+    ):
+        with pytest.raises(JWTError):
+            VERIFIERS[backend](token, KEY, "HS256")
+
+
+@backends
+@pytest.mark.parametrize("token", MALFORMED_TOKENS)
+def test_malformed_token_raises_jwt_error(backend, token):
+    with pytest.raises(JWTError):
+        VERIFIERS[backend](token, KEY, "HS256")
+
+
+# the empty and the non ascii token can not even be sent as a header , they are only checked against the verifiers above
+@pytest.mark.parametrize("client", sorted(VERIFIERS), indirect=True)
+@pytest.mark.parametrize("token", [t for t in MALFORMED_TOKENS if t and t.isascii()] + [jwt.encode({"sub": 5}, KEY, algorithm="HS256")])
+def test_bad_bearer_token_is_a_401(client, token):
+    response = client.get("/user/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 401
+
+
+@pytest.mark.parametrize("client", sorted(VERIFIERS), indirect=True)
+def test_verified_token_is_served_from_the_cache(client):
+    token = auth.create_access_token({"sub": "usman"}, timedelta(minutes=5))
+    hits = token_cache.hits
+    for _ in range(3):
+        response = client.get("/user/me", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200
+        assert response.json()["username"] == "usman"
+    assert token_cache.hits == hits + 2
+
+
+def test_cache_entry_ends_with_the_token():
+    cache = TokenCache(max_entries=2, max_seconds=300)
+    cache.put("expired", {"exp": time.time() - 1}, "user")
+    assert cache.get("expired") is None
+
+    cache.put("a", {}, "user a")
+    cache.put("b", {}, "user b")
+    cache.put("c", {}, "user c")
+    assert cache.get("a") is None
+    assert cache.get("c") == ({}, "user c")
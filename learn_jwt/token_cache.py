@@ -0,0 +1,109 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from jose import JWTError, jwt
+
+# clients send the same bearer token again and again , so the verified claims and the user built from them
+# are kept until the token expires (or at most TOKEN_CACHE_MAX_SECONDS , so a disabled user is noticed soon enough)
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_MAX_SECONDS = float(os.getenv("TOKEN_CACHE_MAX_SECONDS", "300"))
+# "jose" (python-jose) or "hmac" (a small HS256 only verifier on top of the standard library , much less work per token)
+JWT_VERIFIER = os.getenv("JWT_VERIFIER", "jose")
+
+
+def _b64decode(part: str) -> bytes:
+    return base64.urlsafe_b64decode(part + "=" * (-len(part) % 4))
+
+
+def verify_with_jose(token: str, key: str, algorithm: str) -> dict:
+    return jwt.decode(token, key, algorithms=[algorithm])
+
+
+def verify_with_hmac(token: str, key: str, algorithm: str) -> dict:
+    # same checks as jose does for our tokens : HS256 signature and the exp claim , raises JWTError the same way
+    if algorithm != "HS256":
+        raise JWTError("the hmac verifier only supports HS256")
+    try:
+        header_b64, payload_b64, signature_b64 = token.split(".")
+        header = json.loads(_b64decode(header_b64))
+        payload = json.loads(_b64decode(payload_b64))
+        signature = _b64decode(signature_b64)
+    except (ValueError, TypeError):
+        raise JWTError("malformed token")
+    # both parts have to be json objects , "W10" is a valid base64 json array but not a token
+    if not isinstance(header, dict) or not isinstance(payload, dict):
+        raise JWTError("malformed token")
+
+    if header.get("alg") != "HS256":
+        raise JWTError("unexpected algorithm")
+    expected = hmac.new(key.encode(), f"{header_b64}.{payload_b64}".encode(), hashlib.sha256).digest()
+    if not hmac.compare_digest(signature, expected):
+        raise JWTError("signature verification failed")
+    exp = payload.get("exp")
+    if exp is not None and (not isinstance(exp, (int, float)) or exp <= time.time()):
+        raise JWTError("signature has expired")
+    return payload
+
+
+VERIFIERS = {"jose": verify_with_jose, "hmac": verify_with_hmac}
+verify_jwt = VERIFIERS[JWT_VERIFIER]
+
+
+class TokenCache:
+
+    def __init__(self, max_entries: int, max_seconds: float):
+        self.max_entries = max_entries
+        self.max_seconds = max_seconds
+        self.entries = OrderedDict()      # sha256 of the token -> (valid until , claims , user)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        # the token itself is not kept in memory , only its digest
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str):
+        key = self.key(token)
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] <= now:
+                self.entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, token: str, claims: dict, user):
+        valid_until = time.time() + self.max_seconds
+        if isinstance(claims.get("exp"), (int, float)):
+            valid_until = min(valid_until, claims["exp"])
+        key = self.key(token)
+        with self.lock:
+            self.entries[key] = (valid_until, claims, user)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "verifier": JWT_VERIFIER,
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_MAX_SECONDS)
@@ -3,6 +3,8 @@ from sqlalchemy.orm import sessionmaker
 import random
 from sqlalchemy import func
 from models import Address
+from queries import users_with_addresses
+from query_guard import max_statements
 
 # Session=sessionmaker(bind=engine)
 # session=Session()
@@ -76,14 +78,17 @@ session.add(user_1)
 session.commit()
 session.close()
 
-users=session.query(User).all()
-for u in users:
-    print(f"id {u.id} name : {u.name} ")
-    
-    if u.addresses:
-        for ad in u.addresses:
-            print(f"city {ad.city} postal_address :{ad.postal_address}")
-    print()
+# session.query(User).all() and then u.addresses runs one more SELECT for every user (the N+1 problem)
+# the helper loads the addresses of all users together , the guard makes sure it stays at 2 statements
+with max_statements(engine,2):
+    users=users_with_addresses(session)
+    for u in users:
+        print(f"id {u.id} name : {u.name} ")
+        
+        if u.addresses:
+            for ad in u.addresses:
+                print(f"city {ad.city} postal_address :{ad.postal_address}")
+        print()
 
 
 
@@ -1,10 +1,16 @@
 from sqlalchemy import create_engine , ForeignKey 
 from sqlalchemy.orm import declarative_base , Mapped , mapped_column , relationship 
 from typing import List
+import os
 
 db_url="sqlite:///database.db"
 
-engine=create_engine(db_url,echo=True)    # manages all the connections between the SQL and the python and do inter-translate the code
+# every statement printed (echo) is slow and noisy , SQL_ECHO=1 turns it back on when the SQL needs to be seen
+engine=create_engine(db_url,echo=os.getenv("SQL_ECHO","0")=="1")    # manages all the connections between the SQL and the python and do inter-translate the code
+
+# how User.addresses is loaded when nothing else is asked for in the query :
+# "select" (the default , lazy , one extra SELECT for every user whose addresses are touched) , "selectin" or "joined"
+ADDRESSES_LOADING=os.getenv("ADDRESSES_LOADING","select")
 
 Base=declarative_base()      # its a base class that provides the base from which all the classes of the database are inherited
 
@@ -27,7 +33,7 @@ class User(Basemodel):    # this python class represents a table in our database
 
     name:Mapped[str]=mapped_column(nullable=False)    # the none shows that the field is optional
     age:Mapped[int | None]=mapped_column()
-    addresses:Mapped[list[str]]=relationship(Address,back_populates="user")
+    addresses:Mapped[List["Address"]]=relationship(Address,back_populates="user",lazy=ADDRESSES_LOADING)
 
 Base.metadata.create_all(engine)    # base.metadata collects all the definitions of the tables and then .creata_all do the connection with the database and then creates all the tables if they don't exist,,also it creates the database.db file if it don't exists
 
@@ -0,0 +1,23 @@
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload , selectinload , subqueryload
+from models import User
+
+# the loader options that can be asked for per query , they win over the lazy= default of the relationship
+#   selectin -> 2 statements , the users and then all their addresses with one  WHERE user_id IN (...)
+#   joined   -> 1 statement , users LEFT OUTER JOIN addresses (every user row is repeated once per address)
+#   subquery -> 2 statements , the addresses are loaded by re-running the users query as a subquery
+LOADERS={
+    "selectin":selectinload,
+    "joined":joinedload,
+    "subquery":subqueryload,
+}
+
+
+# all users with their addresses already loaded , touching u.addresses afterwards does not go to the database
+# so the number of statements stays the same however many users there are
+def users_with_addresses(session , strategy="selectin"):
+    query=select(User).options(LOADERS[strategy](User.addresses)).order_by(User.id)
+    result=session.scalars(query)
+    if strategy=="joined":
+        result=result.unique()    # the join gives one row per address , unique() folds them back into one user each
+    return result.all()
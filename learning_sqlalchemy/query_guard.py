@@ -0,0 +1,29 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+
+
+class TooManyStatements(AssertionError):
+    pass
+
+
+# counts the statements that really go to the database inside the with block and fails when there are more than max_count
+# wrap a logical read with it (in a test or a script) and an N+1 (one extra query per row) shows up right away
+#
+#     with max_statements(engine,2):
+#         users=users_with_addresses(session)
+@contextmanager
+def max_statements(engine , max_count):
+    statements=[]
+
+    def record(conn , cursor , statement , parameters , context , executemany):
+        statements.append(statement)
+
+    event.listen(engine , "before_cursor_execute" , record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine , "before_cursor_execute" , record)
+
+    if len(statements) > max_count:
+        listing="\n".join(f"  {i+1}. {s}" for i , s in enumerate(statements))
+        raise TooManyStatements(f"expected at most {max_count} statements but {len(statements)} were run:\n{listing}")
@@ -1,8 +1,23 @@
-from fastapi import FastAPI, HTTPException
-from typing import Optional ,Annotated
-from pydantic import BaseModel, Field,Literal
+import base64
+import csv
+import io
+import json
+from itertools import islice
+import orjson
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from typing import Optional ,Annotated, Literal
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+from student_store import StudentStore, StudentExists, StudentNotFound
+from common.response_cache import ResponseCache
+from common.bulk_body import media_type, parse_records
 
-app = FastAPI()
+# orjson writes the responses , it is several times faster than the stdlib json for the big student lists
+app = FastAPI(default_response_class=ORJSONResponse)
+
+# serialized responses of the hot read endpoints , the write endpoints invalidate what they change
+response_cache = ResponseCache()
 
 students = [
     {"id": 1, "name": "Fawas Anayat", "age": 22, "grade": "A", "city": "Mansehra"},
@@ -12,8 +27,11 @@ students = [
     {"id": 5, "name": "Ayesha Iqbal", "age": 22, "grade": "B", "city": "Peshawar"},
 ]
 
+# all the lookups go through the store's indexes instead of scanning the list
+store = StudentStore(students)
+
 class Student(BaseModel):
-    id:Annotated[str,Field(...,description='.this is the id of the person ',examples='1,2,3,....')]
+    id:Annotated[int,Field(...,description='.this is the id of the person ',examples='1,2,3,....')]
     name :Annotated[str,Field(min_length=5, max_length=25)]
     age: int = Field(gt=5, lt=30)
     city: str
@@ -34,42 +52,170 @@ def home():
     return {"message": "Welcome to the House Price Predictor ...This is the lastest House price predictor traind on the best AI models and the best real world data and hence its relaible and trust worthy"}
 
 @app.get("/studentData/{student_id}")
+@response_cache.cached(ttl=60, tags=("student:{student_id}",))
 def student_data_by_id(student_id: int):
-    for student in students:
-        if student_id == student["id"]:
-            return student
-    raise HTTPException(status_code=404, detail="student not found")
+    student = store.get(student_id)
+    if student is None:
+        raise HTTPException(status_code=404, detail="student not found")
+    return student
+
+# the cursor is just the position of the last student on the page , base64 encoded so clients treat it as an opaque string
+def encode_cursor(position: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"after": position}).encode()).decode()
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        return int(json.loads(base64.urlsafe_b64decode(cursor.encode()))["after"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+def parse_fields(fields: Optional[str]):
+    if not fields:
+        return None
+    selected = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in selected if f not in Student.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"unknown fields: {', '.join(unknown)}")
+    return selected
+
+def project(student: dict, selected):
+    if selected is None:
+        return student
+    return {f: student.get(f) for f in selected}
 
+# json pages are limited (100 by default , 1000 at most) , the next page is asked for with the cursor from the X-Next-Cursor header
+# format=ndjson streams every match one json object per line as it is found , so big exports do not build the whole list in memory
+# the students are plain dicts already , so the page goes straight to orjson without the jsonable_encoder walk
 @app.get("/students")
 def students_filtering(
     name: Optional[str] = None,
     city: Optional[str] = None,
     grade: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    format: Literal["json", "ndjson"] = "json",
 ):
-    results = students
-    if name:
-        results = [s for s in results if name.lower() in s["name"].lower()]
-    if grade:
-        results = [s for s in results if grade.upper() == s["grade"].upper()]
-    if city:
-        results = [s for s in results if city.lower() in s["city"].lower()]
-    return results
+    selected = parse_fields(fields)
+    after = decode_cursor(cursor) if cursor else -1
+    matches = store.iter_filtered(name=name, city=city, grade=grade, after=after)
+
+    if format == "ndjson":
+        def lines():
+            for _, student in islice(matches, offset, None):
+                yield orjson.dumps(project(student, selected)) + b"\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    # one extra row is read to know if there is a next page
+    page = list(islice(matches, offset, offset + limit + 1))
+    headers = {}
+    if len(page) > limit:
+        page = page[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(page[-1][0])
+    return ORJSONResponse([project(student, selected) for _, student in page], headers=headers)
 
 @app.post("/addStudents")
 def add_student(student: Student):
-    for s in students:
-        if student.id == s["id"]:
-            raise HTTPException(status_code=400, detail="student already exists")
-    students.append(student.dict())
+    try:
+        store.add(student.dict())
+    except StudentExists:
+        raise HTTPException(status_code=400, detail="student already exists")
     return {"message": "student added", "student": student}
 
+# a whole roster in one request , the body can be a json array , NDJSON (one student per line) or a csv file with a header row
+MAX_BULK_STUDENTS = 100_000
+
+def parse_bulk(body: bytes, content_type: str) -> list:
+    if media_type(content_type) == "text/csv":
+        try:
+            reader = csv.DictReader(io.StringIO(body.decode("utf-8-sig")))
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="csv must be utf-8")
+        # empty cells are left out so optional fields get their default and missing required ones are reported
+        return [{k: v for k, v in row.items() if v not in ("", None)} for row in reader]
+    return parse_records(body, content_type, "students")
+
+StudentList = TypeAdapter(list[Student])
+
+def validate_bulk(rows: list):
+    # the whole list is validated in one pass , when some rows fail the errors are grouped by row and only the good rows are validated again
+    errors = {i: [{"type": "json_invalid", "msg": str(row)}] for i, row in enumerate(rows) if isinstance(row, ValueError)}
+    candidates = [i for i in range(len(rows)) if i not in errors]
+    try:
+        valid = StudentList.validate_python([rows[i] for i in candidates])
+    except ValidationError as e:
+        for error in e.errors(include_url=False, include_context=False):
+            index = candidates[error["loc"][0]]
+            errors.setdefault(index, []).append({**error, "loc": error["loc"][1:]})
+        candidates = [i for i in candidates if i not in errors]
+        valid = StudentList.validate_python([rows[i] for i in candidates])
+    return dict(zip(candidates, valid)), errors
+
+def import_students(rows: list, mode: str, atomic: bool):
+    valid, errors = validate_bulk(rows)
+
+    # duplicates are checked against a set of the ids in this batch and the store's id index
+    seen = set()
+    for index, student in valid.items():
+        if student.id in seen:
+            errors[index] = [{"type": "duplicate", "msg": f"id {student.id} appears more than once in this batch"}]
+        elif mode == "insert" and student.id in store:
+            errors[index] = [{"type": "duplicate", "msg": f"student {student.id} already exists"}]
+        seen.add(student.id)
+
+    results = [{"index": i, "status": "error", "errors": errors[i]} if i in errors else None for i in range(len(rows))]
+    accepted = [i for i in valid if i not in errors]
+
+    if errors and atomic:
+        for i in accepted:
+            results[i] = {"index": i, "id": valid[i].id, "status": "not applied"}
+        raise HTTPException(status_code=422, detail={"message": "nothing was imported", "failed": len(errors), "results": results})
+
+    try:
+        outcomes = store.bulk_put([valid[i].model_dump() for i in accepted], upsert=mode == "upsert")
+    except StudentExists as e:
+        # another request added this id after the check above
+        raise HTTPException(status_code=409, detail=f"student {e.args[0]} already exists")
+    response_cache.invalidate(*(f"student:{valid[i].id}" for i in accepted))
+
+    for i, outcome in zip(accepted, outcomes):
+        results[i] = {"index": i, "id": valid[i].id, "status": outcome}
+
+    return {
+        "received": len(rows),
+        "created": outcomes.count("created"),
+        "updated": outcomes.count("updated"),
+        "failed": len(errors),
+        "results": results,
+    }
+
+@app.post("/students/bulk")
+async def bulk_students(
+    request: Request,
+    mode: Literal["insert", "upsert"] = "insert",
+    atomic: bool = True,
+):
+    rows = parse_bulk(await request.body(), request.headers.get("content-type", ""))
+    if len(rows) > MAX_BULK_STUDENTS:
+        raise HTTPException(status_code=413, detail=f"at most {MAX_BULK_STUDENTS} students per request")
+    # validating thousands of rows is cpu work , it runs in the threadpool so other requests are not blocked
+    return await run_in_threadpool(import_students, rows, mode, atomic)
+
 @app.put("/updateStudents/{student_id}")
 def update_student(student_id: int, student: Student):
-    for i, s in enumerate(students):
-        if student_id == s["id"]:
-            students[i] = student.dict()
-            return {"message": "student updated", "student": students[i]}
-    raise HTTPException(status_code=404, detail="student not found")
+    try:
+        updated = store.update(student_id, student.dict())
+    except StudentNotFound:
+        raise HTTPException(status_code=404, detail="student not found")
+    except StudentExists:
+        raise HTTPException(status_code=400, detail="student already exists")
+    response_cache.invalidate(f"student:{student_id}", f"student:{student.id}")
+    return {"message": "student updated", "student": updated}
+
+@app.get("/cacheStats")
+def cache_stats():
+    return response_cache.stats()
 
 # when we want to do the inference of the some of the ML model in the fastapi then we use the https method as the post.
 # post is used when we want that the client send some data to the server and then server process it and infer some results from it.
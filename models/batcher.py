@@ -0,0 +1,116 @@
+import asyncio
+import time
+from collections import deque
+from fastapi.concurrency import run_in_threadpool
+
+
+# collects the requests that arrive at the same time and runs the model once for all of them
+# the first request of a batch waits at most max_wait_ms for others to join , a full batch is flushed right away
+class MicroBatcher:
+
+    def __init__(self, predict_fn, max_batch_size: int = 64, max_wait_ms: float = 2.0):
+        self.predict_fn = predict_fn          # takes a list of inputs and returns a list of outputs in the same order
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.pending = deque()
+        self.arrived = asyncio.Event()
+        self.task = None
+
+        # metrics
+        self.batches = 0
+        self.items = 0
+        self.histogram = {}                   # batch size bucket -> number of batches
+        self.last_flush_ms = 0.0
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        while self.pending:
+            _, future = self.pending.popleft()
+            if not future.done():
+                future.set_exception(RuntimeError("the batcher was stopped"))
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((item, future))
+        self.arrived.set()
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self.pending:
+                self.arrived.clear()
+                await self.arrived.wait()
+                continue
+
+            batch = [self.pending.popleft()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                if self.pending:
+                    batch.append(self.pending.popleft())
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                self.arrived.clear()
+                try:
+                    await asyncio.wait_for(self.arrived.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            await self.flush(batch)
+
+    async def flush(self, batch):
+        # a client that disconnected while waiting has its future cancelled , no need to score it
+        batch = [(item, future) for item, future in batch if not future.cancelled()]
+        if not batch:
+            return
+
+        started = time.perf_counter()
+        try:
+            results = await run_in_threadpool(self.predict_fn, [item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.last_flush_ms = (time.perf_counter() - started) * 1000
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+        self.record(len(batch))
+
+    def record(self, size: int):
+        self.batches += 1
+        self.items += size
+        # power of two buckets : 1 , 2 , <=4 , <=8 ...
+        bucket = 1
+        while bucket < size:
+            bucket *= 2
+        key = str(bucket) if bucket <= 2 else f"<={bucket}"
+        self.histogram[key] = self.histogram.get(key, 0) + 1
+
+    def stats(self) -> dict:
+        return {
+            "enabled": True,
+            "max batch size": self.max_batch_size,
+            "max wait ms": self.max_wait * 1000,
+            "queued": len(self.pending),
+            "batches": self.batches,
+            "requests": self.items,
+            "mean batch size": self.items / self.batches if self.batches else 0,
+            "batch size histogram": dict(sorted(self.histogram.items(), key=lambda kv: int(kv[0].lstrip("<=")))),
+            "last flush ms": round(self.last_flush_ms, 3),
+        }
@@ -0,0 +1,71 @@
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+
+
+# for a linear model the whole pipeline (imputer , scaler , one hot encoder , linear regression) is just an affine function of the inputs
+# so it can be folded once at startup into  prediction = offsets[location] + w_area*area + w_bedrooms*bedrooms + w_age*age
+# and after that a prediction is a few float multiplications , no DataFrame and no sklearn dispatch
+class LinearFastPath:
+
+    def __init__(self, numeric: list, weights: np.ndarray, locations: list, offsets: np.ndarray):
+        self.numeric = numeric                          # numeric feature names in the order of the weights
+        self.weights = weights
+        self.location_index = {loc: i for i, loc in enumerate(locations)}
+        self.offsets = offsets
+        # plain python floats are faster than numpy scalars for a single row
+        self._weights = [float(w) for w in weights]
+        self._offsets = {loc: float(offsets[i]) for loc, i in self.location_index.items()}
+
+    def predict_one(self, row) -> float:
+        value = self._offsets[row.location]
+        for name, weight in zip(self.numeric, self._weights):
+            value += weight * getattr(row, name)
+        return value
+
+    def predict_many(self, rows) -> np.ndarray:
+        x = np.empty((len(rows), len(self.numeric)), dtype=np.float64)
+        for j, name in enumerate(self.numeric):
+            x[:, j] = [getattr(row, name) for row in rows]
+        codes = np.fromiter((self.location_index[row.location] for row in rows), dtype=np.intp, count=len(rows))
+        return self.offsets[codes] + x @ self.weights
+
+    def predict_columns(self, columns: dict) -> np.ndarray:
+        # same as predict_many but the inputs are already arrays , one per feature
+        x = np.column_stack([np.asarray(columns[name], dtype=np.float64) for name in self.numeric])
+        codes = np.array([self.location_index[loc] for loc in columns["location"]], dtype=np.intp)
+        return self.offsets[codes] + x @ self.weights
+
+
+def _frame(records, features):
+    return pd.DataFrame(records, columns=features)
+
+
+def build_fast_path(model, features: list, locations: list, check_rows: int = 256):
+    # returns None when the model can not be folded , the caller then keeps using the pandas path
+    final = model.steps[-1][1] if hasattr(model, "steps") else model
+    if not hasattr(final, "coef_") or not hasattr(final, "intercept_"):
+        return None
+
+    numeric = [f for f in features if f != "location"]
+
+    # probe the real pipeline : one all zero row per location gives the offsets , one unit row per numeric feature gives the weights
+    zeros = [{**{f: 0 for f in numeric}, "location": loc} for loc in locations]
+    units = [{**{f: int(f == name) for f in numeric}, "location": locations[0]} for name in numeric]
+    probe = model.predict(_frame(zeros + units, features))
+    offsets = np.asarray(probe[:len(locations)], dtype=np.float64)
+    weights = np.asarray(probe[len(locations):], dtype=np.float64) - offsets[0]
+    fast = LinearFastPath(numeric, weights, locations, offsets)
+
+    # parity check against the pandas path on random inputs , if the pipeline is not really affine we do not use the fast path
+    rng = np.random.default_rng(0)
+    sample = [
+        {**{f: int(rng.integers(0, 3000)) for f in numeric}, "location": locations[int(rng.integers(len(locations)))]}
+        for _ in range(check_rows)
+    ]
+    expected = model.predict(_frame(sample, features))
+    got = fast.predict_many([SimpleNamespace(**record) for record in sample])
+    if not np.allclose(got, expected, rtol=1e-9, atol=1e-6):
+        return None
+    return fast
+
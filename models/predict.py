@@ -1,7 +1,53 @@
-import pickle
+import gc
+import os
+from pathlib import Path
+from models.registry import ModelRegistry
 
-#loading the model
-with open('models/lr_model.pkl','rb') as f:
-    model=pickle.load(f)
+# the artifacts live next to this file , so it no longer matters from which folder the api is started
+MODEL_DIR=Path(os.getenv('MODEL_DIR',Path(__file__).parent))
 
-MODEL_VERSION='1.0.0'
\ No newline at end of file
+# the columns (and their order) that the model was trained on
+FEATURES=['area','bedrooms','location','age']
+LOCATIONS=['cityA','cityB','cityC']
+
+# a valid house used to warm up a freshly loaded model before it starts serving
+WARMUP_ROW={'area':1200,'bedrooms':3,'location':'cityA','age':12}
+
+# the newest artifact in MODEL_DIR is served unless MODEL_VERSION pins one
+# the fast path is None when the model is not linear or it did not match the pandas path (set PREDICT_FAST_PATH=0 to turn it off)
+registry=ModelRegistry(
+    MODEL_DIR,
+    FEATURES,
+    LOCATIONS,
+    WARMUP_ROW,
+    use_fast_path=os.getenv('PREDICT_FAST_PATH','1') == '1',
+    pinned_version=os.getenv('MODEL_VERSION')
+)
+
+# importing this module does not load anything , the model is loaded by the app lifespan or on first use through get_model()
+# with MODEL_PRELOAD=1 it is loaded right here instead , so under `gunicorn app:app --preload -k uvicorn.workers.UvicornWorker -w 4`
+# the master process loads it once and the forked workers share its memory pages copy on write instead of each loading a copy
+MODEL_PRELOAD=os.getenv('MODEL_PRELOAD','0') == '1'
+
+
+def get_model():
+    return registry.get()
+
+
+def predict_one(row):
+    return get_model().predict_one(row)
+
+
+def predict_many(rows):
+    return get_model().predict_many(rows)
+
+
+def predict_columns(columns):
+    return get_model().predict_columns(columns)
+
+
+if MODEL_PRELOAD:
+    get_model()
+    # move everything loaded so far out of the garbage collector's reach , otherwise the collector
+    # writes to those objects in every worker and the shared pages get copied anyway
+    gc.freeze()
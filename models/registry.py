@@ -0,0 +1,165 @@
+import pickle
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+import pandas as pd
+from models.fast_path import build_fast_path
+
+# lr_model.pkl was shipped before versioned artifacts existed , it is treated as this version
+LEGACY_VERSION = "1.0.0"
+
+
+def artifact_version(path: Path) -> str:
+    # lr_model-1.2.0.pkl -> 1.2.0 , lr_model.pkl -> 1.0.0
+    _, sep, version = path.stem.partition("-")
+    return version if sep else LEGACY_VERSION
+
+
+def version_key(version: str):
+    # so that 1.10.0 sorts after 1.9.0 , a version that is not all numbers sorts by its text
+    parts = version.split(".")
+    if all(p.isdigit() for p in parts):
+        return (1, tuple(int(p) for p in parts), "")
+    return (0, (), version)
+
+
+# one loaded model with everything that was worked out for it , it is never changed after loading
+# so a request that picked it up can finish with it even if a newer model gets swapped in meanwhile
+@dataclass(frozen=True)
+class LoadedModel:
+    version: str
+    path: Path
+    model: object
+    features: list
+    fast_path: object
+    loaded_at: datetime
+    load_seconds: float
+
+    # the original way , a one row DataFrame through the whole sklearn pipeline
+    def predict_one_pandas(self, row):
+        input_df = pd.DataFrame([{f: getattr(row, f) for f in self.features}], columns=self.features)
+        return self.model.predict(input_df)[0]
+
+    def predict_many_pandas(self, rows):
+        columns = {f: [getattr(row, f) for row in rows] for f in self.features}
+        return self.model.predict(pd.DataFrame(columns, columns=self.features))
+
+    def predict_one(self, row):
+        if self.fast_path is not None:
+            return self.fast_path.predict_one(row)
+        return self.predict_one_pandas(row)
+
+    # scores many inputs with one model call , building the frame column by column is much cheaper than making a one row frame for every input
+    def predict_many(self, rows):
+        if self.fast_path is not None:
+            return self.fast_path.predict_many(rows)
+        return self.predict_many_pandas(rows)
+
+    def predict_columns(self, columns):
+        if self.fast_path is not None:
+            return self.fast_path.predict_columns(columns)
+        return self.model.predict(pd.DataFrame(columns, columns=self.features))
+
+    def info(self) -> dict:
+        return {
+            "version": self.version,
+            "path": str(self.path),
+            "loaded at": self.loaded_at.isoformat(),
+            "load seconds": round(self.load_seconds, 4),
+            "fast path": self.fast_path is not None,
+        }
+
+
+# keeps track of the model artifacts in a directory (lr_model-<version>.pkl) and of the model that is serving right now
+# loading and warming up a model happens before the swap , the swap itself is one reference assignment
+class ModelRegistry:
+
+    def __init__(self, directory: Path, features: list, locations: list, warmup_row: dict,
+                 use_fast_path: bool = True, pinned_version: str = None):
+        self.directory = Path(directory)
+        self.features = features
+        self.locations = locations
+        self.warmup_row = warmup_row
+        self.use_fast_path = use_fast_path
+        self.pinned_version = pinned_version
+        self.active = None
+        self.seen = None
+        self.lock = threading.Lock()
+        self.init_lock = threading.Lock()
+
+    def artifacts(self) -> dict:
+        return {artifact_version(p): p for p in self.directory.glob("*.pkl")}
+
+    def versions(self) -> list:
+        return sorted(self.artifacts(), key=version_key)
+
+    def snapshot(self) -> dict:
+        # file name -> modification time , used by the watcher to notice new or replaced artifacts
+        return {p.name: p.stat().st_mtime for p in self.directory.glob("*.pkl")}
+
+    def changed(self) -> bool:
+        current = self.snapshot()
+        if self.seen is None or current == self.seen:
+            return False
+        self.seen = current
+        return True
+
+    def target_version(self, version: str = None) -> str:
+        version = version or self.pinned_version
+        if version is None:
+            versions = self.versions()
+            if not versions:
+                raise FileNotFoundError(f"no model artifacts in {self.directory}")
+            version = versions[-1]
+        return version
+
+    def load(self, version: str = None) -> LoadedModel:
+        version = self.target_version(version)
+        self.seen = self.snapshot()
+        path = self.artifacts().get(version)
+        if path is None:
+            raise FileNotFoundError(f"no artifact for model version {version} in {self.directory}")
+
+        started = time.perf_counter()
+        with open(path, "rb") as f:
+            model = pickle.load(f)
+        fast_path = build_fast_path(model, self.features, self.locations) if self.use_fast_path else None
+        loaded = LoadedModel(
+            version=version,
+            path=path,
+            model=model,
+            features=self.features,
+            fast_path=fast_path,
+            loaded_at=datetime.now(timezone.utc),
+            load_seconds=time.perf_counter() - started,
+        )
+
+        # pre warm , the first real request should not be the one paying for lazy initialisation inside sklearn
+        row = SimpleNamespace(**self.warmup_row)
+        loaded.predict_one_pandas(row)
+        loaded.predict_one(row)
+        return loaded
+
+    def swap(self, loaded: LoadedModel) -> LoadedModel:
+        with self.lock:
+            previous = self.active
+            self.active = loaded
+        return previous
+
+    def activate(self, version: str = None) -> LoadedModel:
+        loaded = self.load(version)
+        self.swap(loaded)
+        return loaded
+
+    def get(self) -> LoadedModel:
+        # nothing is loaded until the first time a model is needed , only one thread does the loading
+        active = self.active
+        if active is None:
+            with self.init_lock:
+                if self.active is None:
+                    self.activate()
+            active = self.active
+        return active
@@ -0,0 +1,75 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+
+# benchmark for POST /users/bulk :  python -m new_project.bench_bulk [--rows 2000] [--chunks 50 500 5000] [--existing 0.5]
+# a local sqlite file stands in for the MySQL database , DATABASE_URL is pointed at it before database.py is imported
+#   single : one crud.create_user call per user , the way POST /users/ is used today
+#   bulk   : crud.create_users_bulk at every chunk size and for every on_conflict mode
+# for skip and update --existing of the emails are already in the table , fail only does work when nothing conflicts
+# so it gets a batch of new emails only , every run starts from the same table
+folder = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(folder.name) / 'bench.db'}"
+
+from . import crud
+from .database import database
+from .models import users
+from .schemas import UserCreate
+
+
+def batch(rows : int) -> list:
+    return [UserCreate(name=f"user {i}", email=f"user{i}@example.com") for i in range(rows)]
+
+
+async def reset(existing : list):
+    await database.execute(users.delete())
+    if existing:
+        await database.execute(users.insert().values([{"name": "old name", "email": u.email} for u in existing]))
+
+
+async def timed(rows : int, fn) -> dict:
+    started = time.perf_counter()
+    await fn()
+    seconds = time.perf_counter() - started
+    return {"rows": rows, "seconds": round(seconds, 3), "rows/s": round(rows / seconds, 1)}
+
+
+async def main(rows : int, chunks : list, existing_share : float) -> list:
+    await database.connect()
+    new_users = batch(rows)
+    existing = new_users[:int(rows * existing_share)]
+    results = []
+
+    async def single():
+        for u in new_users:
+            await crud.create_user(u.name, u.email)
+
+    await reset([])
+    results.append({"path": "single", "chunk": "-", "on_conflict": "-", **await timed(rows, single)})
+
+    for chunk_size in chunks:
+        for on_conflict in ("skip", "update", "fail"):
+            await reset(existing if on_conflict != "fail" else [])
+            run = lambda: crud.create_users_bulk(new_users, on_conflict, chunk_size)
+            results.append({"path": "bulk", "chunk": chunk_size, "on_conflict": on_conflict, **await timed(rows, run)})
+
+    await database.disconnect()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="compare one insert per user with create_users_bulk on a local sqlite file")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--chunks", type=int, nargs="+", default=[50, 500, 5000])
+    parser.add_argument("--existing", type=float, default=0.5, help="share of the emails that already exist for skip and update")
+    args = parser.parse_args()
+
+    rows = asyncio.run(main(args.rows, args.chunks, args.existing))
+    folder.cleanup()
+    columns = list(rows[0])
+    print("  ".join(f"{c:>12}" for c in columns))
+    for row in rows:
+        print("  ".join(f"{row[c]!s:>12}" for c in columns))
@@ -1,11 +1,96 @@
-from models import users
-from database import database
+import os
+from .models import users
+from .database import database
+
+# how many users go into one INSERT statement in create_users_bulk
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "500"))
+
+class BulkConflict(Exception):
+    def __init__(self, emails):
+        super().__init__(f"{len(emails)} emails already exist")
+        self.emails = emails
 
 async def create_user(name: str, email: str):
     query = users.insert().values(name=name, email=email)
     user_id = await database.execute(query)
     return {"id": user_id, "name": name, "email": email}
 
-async def get_users():
-    query = users.select()
-    return await database.fetch_all(query)
+# keyset pagination on users.id , a page starts right after the last id of the previous page
+# so every page is one index range read no matter how deep the client pages
+def users_after(after_id=None):
+    query = users.select().order_by(users.c.id)
+    if after_id is not None:
+        query = query.where(users.c.id > after_id)
+    return query
+
+async def get_users(after_id=None, limit: int = 100):
+    return await database.fetch_all(users_after(after_id).limit(limit))
+
+# rows come one by one from the database cursor , the table is never loaded as a whole
+async def iter_users(after_id=None):
+    async for row in database.iterate(users_after(after_id)):
+        yield row
+
+# updates the name of many existing users with one execute_many , a plain text statement because the
+# core update() can not take the email as a parameter in its WHERE while email is also a column
+UPDATE_NAME_BY_EMAIL = f"UPDATE {users.name} SET name = :name WHERE email = :email"
+
+async def existing_emails(emails: list) -> set:
+    rows = await database.fetch_all(users.select().with_only_columns(users.c.email).where(users.c.email.in_(emails)))
+    return {row["email"] for row in rows}
+
+# creates many users in one transaction , chunk by chunk the emails that already exist are looked up through the unique email index
+# and the new users of the chunk are written with one multi row INSERT
+# on_conflict decides what happens to an email that already exists : "skip" leaves it , "update" changes its name , "fail" rolls everything back
+async def create_users_bulk(new_users: list, on_conflict: str = "skip", chunk_size: int = BULK_CHUNK_SIZE) -> list:
+    results = [None] * len(new_users)
+    first_index = {}
+    for i, user in enumerate(new_users):
+        if user.email in first_index:
+            results[i] = {"index": i, "email": user.email, "status": "duplicate in batch"}
+        else:
+            first_index[user.email] = i
+
+    unique = list(first_index.items())
+    async with database.transaction():
+        for start in range(0, len(unique), chunk_size):
+            chunk = unique[start:start + chunk_size]
+            emails = [email for email, _ in chunk]
+            existing = await existing_emails(emails)
+
+            while True:
+                if existing and on_conflict == "fail":
+                    # leaving the transaction block with an exception rolls back the chunks already written
+                    raise BulkConflict(sorted(existing))
+
+                inserts = [new_users[i] for email, i in chunk if email not in existing]
+                if not inserts:
+                    break
+                try:
+                    # the INSERT runs in a savepoint so a failed one leaves the chunks before it in place
+                    async with database.transaction():
+                        await database.execute(users.insert().values([{"name": u.name, "email": u.email} for u in inserts]))
+                    break
+                except Exception:
+                    # another request created some of these emails after they were looked up , the unique index refused them
+                    # (every driver has its own IntegrityError class so they are told apart by looking again)
+                    # those rows are conflicts like the others and the rest of the chunk is inserted on the next round
+                    now_existing = await existing_emails(emails)
+                    if now_existing <= existing:
+                        raise
+                    existing = now_existing
+
+            updates = []
+            for email, i in chunk:
+                if email not in existing:
+                    status = "created"
+                elif on_conflict == "update":
+                    updates.append({"name": new_users[i].name, "email": email})
+                    status = "updated"
+                else:
+                    status = "skipped"
+                results[i] = {"index": i, "email": email, "status": status}
+            if updates:
+                await database.execute_many(UPDATE_NAME_BY_EMAIL, updates)
+
+    return results
@@ -1,9 +1,19 @@
-from fastapi import FastAPI
-from database import database
-from schemas import UserCreate, UserOut
-import crud
+# started from the repo root :  uvicorn new_project.main:app --reload
+from typing import Literal, Optional
+import orjson
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from .database import database
+from .schemas import UserCreate, UserOut
+from . import crud
+from common.sql_profiling import DatabaseProfiler, SQL_PROFILING
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
+
+if SQL_PROFILING:
+    profiler = DatabaseProfiler()
+    profiler.instrument(database)
+    profiler.install(app)
 
 @app.on_event("startup")
 async def startup():
@@ -17,6 +27,47 @@ async def shutdown():
 async def create_user(user: UserCreate):
     return await crud.create_user(user.name, user.email)
 
+MAX_BULK_USERS = 10_000
+
+@app.post("/users/bulk")
+async def create_users_bulk(
+    new_users: list[UserCreate],
+    on_conflict: Literal["skip", "update", "fail"] = "skip",
+    chunk_size: int = Query(crud.BULK_CHUNK_SIZE, ge=1, le=5000),
+):
+    if len(new_users) > MAX_BULK_USERS:
+        raise HTTPException(status_code=413, detail=f"at most {MAX_BULK_USERS} users per request")
+    try:
+        results = await crud.create_users_bulk(new_users, on_conflict, chunk_size)
+    except crud.BulkConflict as e:
+        raise HTTPException(status_code=409, detail={"message": "nothing was created , these emails already exist", "emails": e.emails})
+
+    counts = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    return {"received": len(new_users), "counts": counts, "results": results}
+
+def user_row(row) -> dict:
+    return {"id": row["id"], "name": row["name"], "email": row["email"]}
+
+# pages of users ordered by id , the next page starts after the id in the X-Next-Cursor header
+# format=ndjson streams every user one json object per line straight from the database cursor
+# the rows come from our own table so they are not validated again with UserOut , they are written out as they are
 @app.get("/users/", response_model=list[UserOut])
-async def read_users():
-    return await crud.get_users()
+async def read_users(
+    after_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    format: Literal["json", "ndjson"] = "json",
+):
+    if format == "ndjson":
+        async def lines():
+            async for row in crud.iter_users(after_id):
+                yield orjson.dumps(user_row(row)) + b"\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    rows = await crud.get_users(after_id, limit + 1)
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = str(rows[-1]["id"])
+    return ORJSONResponse([user_row(row) for row in rows], headers=headers)
@@ -1,5 +1,5 @@
 import sqlalchemy
-from database import metadata ,engine
+from .database import metadata ,engine
 
 users = sqlalchemy.Table(
     "users",
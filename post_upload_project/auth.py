@@ -1,44 +1,60 @@
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import delete , select , update
 from sqlalchemy.orm import Session
-from db import get_db
-from models import AuthorM , RefreshToken
+from .db import get_session , run_db
+from .models import AuthorM , RefreshToken
+from common.hashing import hasher
+from .principals import Principal , principal_cache
+import hashlib
+import hmac
+import os
 import secrets
+import time
 
 SECRET_KEY="mysecertkey"
 ALGORITHM ="HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRES_DAYS = 7
+# key for the refresh token digests , kept apart from the signing key when it is set
+REFRESH_TOKEN_HMAC_KEY = os.getenv("REFRESH_TOKEN_HMAC_KEY", SECRET_KEY).encode()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+# bcrypt runs in the hashing process pool , these only wait for the result
+async def hash_password(password: str) -> str:
+    return await hasher.hash(password)
 
-def authinticate_user(password : str , email : str ,db:Session):
-    user=db.query(AuthorM).filter(AuthorM.email == email).first()
+def find_author_by_email(db : Session , email : str):
+    return db.query(AuthorM).filter(AuthorM.email == email).first()
+
+async def authinticate_user(password : str , email : str ,db):
+    user=await run_db(db , find_author_by_email , email)
     if not user:
         return False
     
-    if not verify_password(password, user.password):
+    if not await verify_password(password, user.password):
         return False
     
     return user  
 
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await hasher.verify(plain_password, hashed_password)
 
 # function to create the refresh token
-# this function just creates the token , for storing the token to the database we need to first hash the token and then separately make a new funvton that will do the complete implemenetation of saving the refresh token to the database
+# only a keyed digest of the token is saved , unlike bcrypt the same token always gives the same digest
+# so the row is found with the jti index and checked with one HMAC instead of running bcrypt over every row
+
+def token_digest(token: str) -> str:
+    return hmac.new(REFRESH_TOKEN_HMAC_KEY, token.encode(), hashlib.sha256).hexdigest()
 
-def create_refresh_token(data : AuthorM , db:Session = Depends(get_db)):
+
+def create_refresh_token(data : AuthorM , db:Session , commit : bool = True):
     now =  datetime.utcnow()
     expire= datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRES_DAYS)
     payload = {
@@ -51,27 +67,95 @@ def create_refresh_token(data : AuthorM , db:Session = Depends(get_db)):
     }
 
     encoded_ref_token = jwt.encode(payload , SECRET_KEY , algorithm=ALGORITHM)
-    store_refresh_token(data , encoded_ref_token, db)
+    store_refresh_token(data , encoded_ref_token, db , commit)
     return encoded_ref_token
 
 
-def store_refresh_token(data : AuthorM , encoded_ref_tokn : RefreshToken , db : Session):
+def store_refresh_token(data : AuthorM , encoded_ref_tokn : str , db : Session , commit : bool = True) -> RefreshToken:
 
     payload = jwt.decode(encoded_ref_tokn, SECRET_KEY, algorithms=[ALGORITHM])
-    jti = payload.get("jti")
-    iat = payload.get("iat")
-    expires_at = datetime.fromtimestamp(payload.get("exp"))
-    token_hash = pwd_context.hash(encoded_ref_tokn)
     
     db_token = RefreshToken(
+        jti=payload["jti"],
         user_id=data.id,
-        token=token_hash,
-        expires_at=expires_at ,
-        created_at = iat
+        token=token_digest(encoded_ref_tokn),
+        expires_at=payload["exp"] ,
+        created_at = payload["iat"]
     )
     
     db.add(db_token)
+    if commit:
+        db.commit()
+    return db_token
+
+
+# every refresh gives a new refresh token and the old one stops working (rotation)
+# if an old one is ever presented again it was stolen or leaked , so all of that author's refresh tokens are revoked (reuse detection)
+def rotate_refresh_token(refresh_token : str , db : Session) -> dict:
+    invalid = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    payload = verify_token(refresh_token)
+    if payload.get("type") != "refresh" or not payload.get("jti"):
+        raise invalid
+
+    stored = db.execute(select(RefreshToken).where(RefreshToken.jti == payload["jti"])).scalar_one_or_none()
+    if stored is None or not hmac.compare_digest(stored.token, token_digest(refresh_token)):
+        raise invalid
+
+    now = int(time.time())
+    # the revoke only matches while the token is still active , so of two requests racing with the same token only one wins
+    claimed = db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.id == stored.id , RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=now)
+    ).rowcount
+    if claimed != 1:
+        db.execute(
+            update(RefreshToken)
+            .where(RefreshToken.user_id == stored.user_id , RefreshToken.revoked_at.is_(None))
+            .values(revoked_at=now)
+        )
+        db.commit()
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="refresh token was already used , all sessions have been signed out",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    user = db.get(AuthorM, stored.user_id)
+    if user is None:
+        db.rollback()
+        raise invalid
+
+    new_refresh_token = create_refresh_token(user, db, commit=False)
+    db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.id == stored.id)
+        .values(replaced_by=jwt.get_unverified_claims(new_refresh_token)["jti"])
+    )
     db.commit()
+
+    return {
+        "access_token": create_access_token(user),
+        "refresh_token": new_refresh_token,
+        "token_type": "bearer"
+    }
+
+
+# deletes expired tokens in small batches through the expires_at index , so the table never stays locked for long
+def delete_expired_refresh_tokens(db : Session , batch_size : int = 5000) -> int:
+    now = int(time.time())
+    deleted = 0
+    while True:
+        expired_ids = select(RefreshToken.id).where(RefreshToken.expires_at < now).limit(batch_size).scalar_subquery()
+        count = db.execute(delete(RefreshToken).where(RefreshToken.id.in_(expired_ids))).rowcount
+        db.commit()
+        deleted += count
+        if count < batch_size:
+            return deleted
     
 
 # function to create the access token
@@ -80,6 +164,7 @@ def create_access_token(data: AuthorM, expires_delta: Optional[timedelta] = None
         "id" : data.id ,
         "name" : data.name ,
         "email" : data.email ,
+        "type" : "access" ,
     }
 
     
@@ -117,17 +202,36 @@ def verify_token(token: str) -> dict:
         ) 
     
 
-def get_current_user(
+def load_principal(db : Session , author_id : int):
+    user = db.get(AuthorM, author_id)
+    return Principal.from_author(user) if user is not None else None
+
+
+# the access token carries the author id , so the author is found by primary key
+# and most of the time not even that , a recently seen author comes from the principal cache
+async def get_current_user(
         token : str = Depends(oauth2_scheme) ,
-        db : Session = Depends(get_db)
-):
+        db = Depends(get_session)
+) -> Principal:
     payload = verify_token(token)
-    user_email = payload.get("email")
-    user = db.query(AuthorM).filter(AuthorM.email == user_email).first()
-    if not user :
+    author_id = payload.get("id")
+    if payload.get("type") == "refresh" or not isinstance(author_id, int):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    principal = principal_cache.get(author_id)
+    if principal is not None:
+        return principal
+
+    principal = await run_db(db , load_principal , author_id)
+    if principal is None :
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND , detail="no user found with this information"
         )
-    return user
+    principal_cache.put(principal)
+    return principal
     
 
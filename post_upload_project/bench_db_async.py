@@ -0,0 +1,116 @@
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+from pathlib import Path
+from sqlalchemy import insert , select
+from sqlalchemy.orm import Session , sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from .db import Base , make_engine , make_async_engine , run_db
+from .models import AuthorM , Post
+from .counters import increment_posts_count
+
+# concurrency benchmark for DB_ASYNC :  python -m post_upload_project.bench_db_async [--concurrency 1 16 64 256] [--requests 2000] [--writes 0.3]
+# both modes run the same session functions through run_db , the way the async endpoints of main.py do
+#   sync  : a normal Session , every call goes to the threadpool (run_in_threadpool , 40 threads by default)
+#   async : an AsyncSession on aiosqlite , every call runs with run_sync on the event loop's driver
+# at every concurrency level that many tasks share --requests operations , it prints req/s and the p50 / p95 latency
+
+AUTHORS = 50
+
+
+def save_post(db : Session , author_id : int):
+    db.execute(insert(Post).values(author_id=author_id , content="a benchmark post"))
+    increment_posts_count(db , author_id)
+    db.commit()
+
+
+def read_posts(db : Session , author_id : int):
+    return db.execute(
+        select(Post.id , Post.author_id , Post.content)
+        .where(Post.author_id == author_id).order_by(Post.id).limit(50)
+    ).all()
+
+
+def seed(engine):
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(AuthorM) , [
+            {"name" : f"author {i}" , "email" : f"author{i}@example.com" , "password" : "x" , "posts_count" : 0}
+            for i in range(AUTHORS)
+        ])
+        conn.execute(insert(Post) , [
+            {"author_id" : random.randint(1 , AUTHORS) , "content" : "a seeded post"} for _ in range(5000)
+        ])
+
+
+async def one_request(make_session , is_async : bool , write_share : float) -> float:
+    fn = save_post if random.random() < write_share else read_posts
+    author_id = random.randint(1 , AUTHORS)
+    started = time.perf_counter()
+    if is_async:
+        async with make_session() as db:
+            await run_db(db , fn , author_id)
+    else:
+        db = make_session()
+        try:
+            await run_db(db , fn , author_id)
+        finally:
+            db.close()
+    return time.perf_counter() - started
+
+
+async def run_level(make_session , is_async : bool , concurrency : int , requests : int , write_share : float) -> dict:
+    queue = iter(range(requests))
+    latencies = []
+
+    async def client():
+        for _ in queue:
+            latencies.append(await one_request(make_session , is_async , write_share))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "req/s" : round(requests / elapsed , 1) ,
+        "p50 ms" : round(latencies[len(latencies) // 2] * 1000 , 2) ,
+        "p95 ms" : round(latencies[int(len(latencies) * 0.95)] * 1000 , 2) ,
+    }
+
+
+async def main(levels : list , requests : int , write_share : float , profile : str):
+    rows = []
+    with tempfile.TemporaryDirectory() as folder:
+        path = Path(folder) / "bench.db"
+        engine = make_engine(url=f"sqlite:///{path}" , profile=profile)
+        seed(engine)
+        async_engine = make_async_engine(url=f"sqlite+aiosqlite:///{path}" , profile=profile)
+        modes = (
+            ("sync" , False , sessionmaker(bind=engine , autoflush=False)) ,
+            ("async" , True , async_sessionmaker(async_engine , autoflush=False , expire_on_commit=False)) ,
+        )
+        for concurrency in levels:
+            for mode , is_async , make_session in modes:
+                result = await run_level(make_session , is_async , concurrency , requests , write_share)
+                rows.append({"mode" : mode , "concurrency" : concurrency , **result})
+        await async_engine.dispose()
+        engine.dispose()
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="compare the sync (threadpool) and the async (aiosqlite) session under concurrency")
+    parser.add_argument("--concurrency" , type=int , nargs="+" , default=[1 , 16 , 64 , 256])
+    parser.add_argument("--requests" , type=int , default=2000 , help="operations per mode and concurrency level")
+    parser.add_argument("--writes" , type=float , default=0.3 , help="share of the operations that write")
+    parser.add_argument("--profile" , default="tuned" , choices=("tuned" , "default"))
+    args = parser.parse_args()
+
+    rows = asyncio.run(main(args.concurrency , args.requests , args.writes , args.profile))
+    columns = list(rows[0])
+    print("  ".join(f"{c:>12}" for c in columns))
+    for row in rows:
+        print("  ".join(f"{row[c]!s:>12}" for c in columns))
@@ -0,0 +1,104 @@
+import argparse
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+from sqlalchemy import insert , select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from .db import Base , make_engine
+from .models import AuthorM , Post
+from .counters import increment_posts_count
+
+# load benchmark for the engine profiles of db.py :  python -m post_upload_project.bench_db_profile [--threads 16] [--seconds 5] [--writes 0.3]
+# every profile gets its own fresh sqlite file , then worker threads run the same mix the api does for the same time
+#   write : insert a post and bump the author's posts_count in one transaction (what /uploadPost does)
+#   read  : one page of an author's posts in id order (what /myPosts does)
+# "default" is the bare engine the project used before (rollback journal , sqlite's own settings)
+# "tuned" is DB_PROFILE=tuned (WAL , synchronous=NORMAL , busy_timeout , mmap and a bigger page cache , a larger pool)
+
+AUTHORS = 50
+
+
+def seed(engine):
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(AuthorM) , [
+            {"name" : f"author {i}" , "email" : f"author{i}@example.com" , "password" : "x" , "posts_count" : 0}
+            for i in range(AUTHORS)
+        ])
+        conn.execute(insert(Post) , [
+            {"author_id" : random.randint(1 , AUTHORS) , "content" : "a seeded post"} for _ in range(5000)
+        ])
+
+
+def worker(Session , deadline : float , write_share : float , results : list):
+    writes = reads = locked = 0
+    latencies = []
+    while time.perf_counter() < deadline:
+        author_id = random.randint(1 , AUTHORS)
+        started = time.perf_counter()
+        try:
+            with Session() as db:
+                if random.random() < write_share:
+                    db.execute(insert(Post).values(author_id=author_id , content="a benchmark post"))
+                    increment_posts_count(db , author_id)
+                    db.commit()
+                    writes += 1
+                else:
+                    db.execute(
+                        select(Post.id , Post.author_id , Post.content)
+                        .where(Post.author_id == author_id).order_by(Post.id).limit(50)
+                    ).all()
+                    reads += 1
+        except OperationalError:
+            # "database is locked" , the request would have failed
+            locked += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+    results.append((writes , reads , locked , latencies))
+
+
+def run(profile : str , threads : int , seconds : float , write_share : float) -> dict:
+    with tempfile.TemporaryDirectory() as folder:
+        engine = make_engine(url=f"sqlite:///{Path(folder) / 'bench.db'}" , profile=profile)
+        seed(engine)
+        Session = sessionmaker(bind=engine , autoflush=False)
+
+        results = []
+        deadline = time.perf_counter() + seconds
+        pool = [threading.Thread(target=worker , args=(Session , deadline , write_share , results)) for _ in range(threads)]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        engine.dispose()
+
+    writes = sum(r[0] for r in results)
+    reads = sum(r[1] for r in results)
+    locked = sum(r[2] for r in results)
+    latencies = sorted(l for r in results for l in r[3])
+    p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0.0
+    return {
+        "profile" : profile ,
+        "ops/s" : round((writes + reads) / seconds , 1) ,
+        "writes/s" : round(writes / seconds , 1) ,
+        "reads/s" : round(reads / seconds , 1) ,
+        "locked errors" : locked ,
+        "p95 ms" : round(p95 , 2) ,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="compare the sqlite engine profiles under concurrent load")
+    parser.add_argument("--threads" , type=int , default=16)
+    parser.add_argument("--seconds" , type=float , default=5)
+    parser.add_argument("--writes" , type=float , default=0.3 , help="share of the operations that write")
+    args = parser.parse_args()
+
+    rows = [run(profile , args.threads , args.seconds , args.writes) for profile in ("default" , "tuned")]
+    columns = list(rows[0])
+    print("  ".join(f"{c:>14}" for c in columns))
+    for row in rows:
+        print("  ".join(f"{row[c]!s:>14}" for c in columns))
@@ -0,0 +1,41 @@
+from sqlalchemy import func , select , update
+from sqlalchemy.orm import Session
+from .db import SessionLocal
+from .models import AuthorM , Post
+
+# AuthorM.posts_count is a denormalized counter , it is changed with a single
+# UPDATE ... SET posts_count = posts_count + n in the same transaction as the posts insert
+# so two uploads at the same time can never overwrite each other's count
+
+
+def increment_posts_count(db : Session , author_id : int , by : int = 1):
+    db.execute(
+        update(AuthorM)
+        .where(AuthorM.id == author_id)
+        .values(posts_count=AuthorM.posts_count + by)
+        .execution_options(synchronize_session=False)
+    )
+
+
+# sets every author's counter back to the real number of posts , only the wrong rows are written
+def reconcile_posts_count(db : Session) -> int:
+    real_count = (
+        select(func.count(Post.id))
+        .where(Post.author_id == AuthorM.id)
+        .correlate(AuthorM)
+        .scalar_subquery()
+    )
+    fixed = db.execute(
+        update(AuthorM)
+        .where(AuthorM.posts_count != real_count)
+        .values(posts_count=real_count)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return fixed
+
+
+# backfill / reconcile from the command line :  python -m post_upload_project.counters
+if __name__ == "__main__":
+    with SessionLocal() as db:
+        print(f"posts_count fixed for {reconcile_posts_count(db)} authors")
@@ -1,13 +1,90 @@
-from sqlalchemy import create_engine
+import os
+from pathlib import Path
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine , event
+from sqlalchemy.ext.asyncio import AsyncSession , async_sessionmaker , create_async_engine
 from sqlalchemy.orm import DeclarativeBase , sessionmaker
 
-DB_URL= "sqlite:///./database.db"
-engine = create_engine(
-    DB_URL,
-    connect_args={"check_same_thread": False}
-)
+# the default database is the file next to this module , whichever folder the app is started from
+DB_URL= os.getenv("DB_URL" , f"sqlite:///{Path(__file__).resolve().parent / 'database.db'}")
+
+# DB_PROFILE=tuned (the default) sets sqlite up for many concurrent requests :
+#   WAL journal  -> readers no longer block the writer and the writer no longer blocks readers
+#   synchronous=NORMAL -> no fsync on every commit in WAL mode , still safe against corruption
+#   busy_timeout -> a writer waits for the lock instead of failing at once with "database is locked"
+#   mmap_size / cache_size -> more of the database is read from memory
+# DB_PROFILE=default keeps sqlite's own settings
+DB_PROFILE = os.getenv("DB_PROFILE" , "tuned")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS" , "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE" , str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB" , "65536"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE" , "10"))
+# DB_SPLIT_READS=1 gives the read only endpoints their own engine and connections (opened query_only)
+# so long reads never queue behind the connections that are writing
+DB_SPLIT_READS = os.getenv("DB_SPLIT_READS" , "0") == "1"
+
+IS_SQLITE = DB_URL.startswith("sqlite")
+
+# DB_ASYNC=1 serves /register , /login , /uploadPost and /myPosts through an AsyncSession on an async driver
+# so a request waiting on the database does not hold one of the threadpool's threads
+# locally that is aiosqlite , for postgres or mysql set ASYNC_DB_URL to a postgresql+asyncpg:// or mysql+aiomysql:// url
+DB_ASYNC = os.getenv("DB_ASYNC" , "0") == "1"
+ASYNC_DB_URL = os.getenv("ASYNC_DB_URL" , DB_URL.replace("sqlite://" , "sqlite+aiosqlite://" , 1))
+
+
+def apply_sqlite_pragmas(read_only : bool = False):
+    def on_connect(dbapi_connection , connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+    return on_connect
+
+
+def make_engine(read_only : bool = False , url : str = DB_URL , profile : str = DB_PROFILE):
+    is_sqlite = url.startswith("sqlite")
+    if not is_sqlite or profile != "tuned":
+        return create_engine(url , connect_args={"check_same_thread": False} if is_sqlite else {})
+
+    # a file database is fine with a normal pool of long lived connections , each one keeps its page cache and pragmas
+    new_engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_POOL_SIZE,
+    )
+    event.listen(new_engine , "connect" , apply_sqlite_pragmas(read_only))
+    return new_engine
+
+
+def make_async_engine(read_only : bool = False , url : str = ASYNC_DB_URL , profile : str = DB_PROFILE):
+    if not url.startswith("sqlite"):
+        return create_async_engine(url , pool_size=DB_POOL_SIZE , max_overflow=DB_POOL_SIZE)
+
+    new_engine = create_async_engine(url , pool_size=DB_POOL_SIZE , max_overflow=DB_POOL_SIZE)
+    if profile == "tuned":
+        # the pragmas are set on the driver connection underneath , the same way as for the sync engine
+        event.listen(new_engine.sync_engine , "connect" , apply_sqlite_pragmas(read_only))
+    return new_engine
+
+
+engine = make_engine()
+read_engine = make_engine(read_only=True) if DB_SPLIT_READS else engine
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+async_engine = make_async_engine() if DB_ASYNC else None
+async_read_engine = (make_async_engine(read_only=True) if DB_SPLIT_READS else async_engine) if DB_ASYNC else None
+
+AsyncSessionLocal = async_sessionmaker(async_engine , autoflush=False , expire_on_commit=False) if DB_ASYNC else None
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine , autoflush=False , expire_on_commit=False) if DB_ASYNC else None
 
 
 class Base(DeclarativeBase):
@@ -18,4 +95,45 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# for the endpoints that only read
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# the async endpoints take their session from here , an AsyncSession when DB_ASYNC=1 and the normal sync Session otherwise
+async def get_session():
+    if DB_ASYNC:
+        async with AsyncSessionLocal() as db:
+            yield db
+    else:
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+async def get_read_session():
+    if DB_ASYNC:
+        async with AsyncReadSessionLocal() as db:
+            yield db
+    else:
+        db = ReadSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+
+# runs plain sync ORM code fn(session , *args) for either kind of session
+# with an AsyncSession it runs on the async driver without blocking the event loop (run_sync) ,
+# with a sync Session it runs in the threadpool like a normal def endpoint would
+async def run_db(db , fn , *args):
+    if isinstance(db , AsyncSession):
+        return await db.run_sync(fn , *args)
+    return await run_in_threadpool(fn , db , *args)
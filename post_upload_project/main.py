@@ -1,25 +1,102 @@
-from fastapi import FastAPI , status , HTTPException , Depends
-from pydantic import BaseModel , EmailStr
-from fastapi.responses import JSONResponse 
+# started from the repo root :  uvicorn post_upload_project.main:app --reload
+import asyncio
+import logging
+import os
+import orjson
+from typing import Literal , Optional
+from fastapi import FastAPI , status , HTTPException , Depends , Query , Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import TypeAdapter , ValidationError
+from fastapi.responses import ORJSONResponse , StreamingResponse
+from sqlalchemy import insert , select
 from sqlalchemy.orm import Session
-from models import AuthorM , Post
-from schemas import AuthorS , Posts ,  Login
-from db import get_db , Base , engine
-from auth import hash_password , verify_password , verify_token , create_access_token , authinticate_user ,  get_current_user , create_tokens
+from .models import AuthorM , Post
+from .schemas import AuthorS , Posts , RefreshRequest , PostOut , AuthorStats , PostOutList , AuthorStatsList , model_response
+from .counters import increment_posts_count
+from .migrations import migrate
+from .db import get_db , get_read_db , get_session , get_read_session , run_db , engine , read_engine , async_engine , async_read_engine , SessionLocal , ReadSessionLocal , AsyncReadSessionLocal , DB_ASYNC
+from .auth import hash_password , authinticate_user ,  get_current_user , create_tokens , rotate_refresh_token , delete_expired_refresh_tokens
 from fastapi.security import OAuth2PasswordRequestForm 
+from common.hashing import hasher
+from common.bulk_body import parse_records
+from .principals import Principal , principal_cache
+from common.sql_profiling import EngineProfiler , SQL_PROFILING
 
-app=FastAPI()
+app=FastAPI(default_response_class=ORJSONResponse)
+logger = logging.getLogger(__name__)
 
-Base.metadata.create_all(bind=engine)
+# creates the missing tables and brings an older database up to date (new columns and indexes) , see migrations.py
+for step in migrate(engine):
+    logger.info("migration : %s" , step)
 
+if SQL_PROFILING:
+    profiler = EngineProfiler()
+    engines = [engine , read_engine] + [e.sync_engine for e in (async_engine , async_read_engine) if e is not None]
+    for each_engine in {id(e) : e for e in engines}.values():
+        profiler.instrument(each_engine)
+    profiler.install(app)
 
-@app.post("/register")
-def register_author(user : AuthorS, db:Session = Depends(get_db)):
-    hashed_password=hash_password(user.password)
-    author_1 = AuthorM(name=user.name , email=user.email , password=hashed_password)
+
+# expired refresh tokens are removed in the background every few minutes
+REFRESH_TOKEN_CLEANUP_MINUTES = float(os.getenv("REFRESH_TOKEN_CLEANUP_MINUTES", "15"))
+cleanup_task = None
+
+
+def cleanup_refresh_tokens():
+    db = SessionLocal()
+    try:
+        return delete_expired_refresh_tokens(db)
+    finally:
+        db.close()
+
+
+async def refresh_token_cleanup_loop():
+    while True:
+        try:
+            await run_in_threadpool(cleanup_refresh_tokens)
+        except Exception:
+            # a locked or unreachable database should not end the loop , the next round tries again
+            logger.exception("refresh token cleanup failed")
+        await asyncio.sleep(REFRESH_TOKEN_CLEANUP_MINUTES * 60)
+
+
+@app.on_event("startup")
+async def start_cleanup():
+    global cleanup_task
+    if REFRESH_TOKEN_CLEANUP_MINUTES > 0:
+        cleanup_task = asyncio.create_task(refresh_token_cleanup_loop())
+
+
+@app.on_event("shutdown")
+def stop_hashing():
+    hasher.shutdown()
+    if cleanup_task is not None:
+        cleanup_task.cancel()
+
+
+@app.get("/health")
+def health():
+    return {
+        "status" : "ok" ,
+        "password hashing" : hasher.stats() ,
+        "principal cache" : principal_cache.stats()
+    }
+
+
+# the database work of the async endpoints is written as plain functions of a session and run through run_db
+# so the same code serves both the async (DB_ASYNC=1) and the sync session
+def save_author(db : Session , name : str , email : str , hashed_password : str) -> AuthorM:
+    author_1 = AuthorM(name=name , email=email , password=hashed_password)
     db.add(author_1)
     db.commit()
     db.refresh(author_1)
+    return author_1
+
+
+@app.post("/register")
+async def register_author(user : AuthorS, db = Depends(get_session)):
+    hashed_password=await hash_password(user.password)
+    author_1 = await run_db(db , save_author , user.name , user.email , hashed_password)
 
     return {
         "id": author_1.id,
@@ -32,16 +109,16 @@ def register_author(user : AuthorS, db:Session = Depends(get_db)):
 
 
 @app.post("/login")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db = Depends(get_session)):
 
-    user=authinticate_user(form_data.password, form_data.username, db)
+    user=await authinticate_user(form_data.password, form_data.username, db)
 
     if user is False:
         raise HTTPException (
             status_code=status.HTTP_401_UNAUTHORIZED , detail="invalid username or password"
         )
     
-    tokens = create_tokens(user,db)
+    tokens = await run_db(db , lambda session : create_tokens(user , session))
     return {
         "access_token" : tokens["access_token"] ,
         "refresh-token" : tokens["refresh_token"] ,
@@ -54,30 +131,144 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
     }
 
 
+@app.post("/refresh")
+def refresh(body : RefreshRequest , db : Session = Depends(get_db)):
+    tokens = rotate_refresh_token(body.refresh_token , db)
+    return {
+        "access_token" : tokens["access_token"] ,
+        "refresh-token" : tokens["refresh_token"] ,
+        "token_type" : tokens["token_type"]
+    }
+
+
+def save_post(db : Session , author_id : int , content : str) -> Post:
+    new_post = Post(content=content , author_id = author_id)
+    db.add(new_post)
+    increment_posts_count(db , author_id)
+    db.commit()
+    db.refresh(new_post)
+    return new_post
+
+
 @app.post('/uploadPost')
-def upload_post(post : Posts ,user : AuthorM = Depends(get_current_user) , db : Session = Depends(get_db)):
+async def upload_post(post : Posts ,user : Principal = Depends(get_current_user) , db = Depends(get_session)):
     # user = authinticate_user(user.password, user.email, db)
     
     # if user is False:
     #     raise HTTPException(status_code=status.HTTP_403_FORBIDDEN , detail="you are unauthorised to perform this action")
-    new_post = Post(content=post.post_content , author = user)
-    db.add(new_post)
-    db.commit()
-    db.refresh(new_post)
+    await run_db(db , save_post , user.id , post.post_content)
 
     return{
         "message" : "post uploaded successfully"
     }
+
+
+# many posts in one request (a json array or NDJSON , one post per line) , all of them are validated first
+# and then written with one executemany style INSERT ... RETURNING id and one counter update , in a single transaction
+MAX_BULK_POSTS = int(os.getenv("MAX_BULK_POSTS" , "5000"))
+PostsList = TypeAdapter(list[Posts])
+
+
+def insert_posts(db : Session , author_id : int , posts : list) -> list:
+    ids = db.scalars(
+        insert(Post).returning(Post.id , sort_by_parameter_order=True) ,
+        [{"author_id" : author_id , "content" : post.post_content} for post in posts]
+    ).all()
+    increment_posts_count(db , author_id , len(ids))
+    db.commit()
+    return ids
+
+
+# the posts go in together or not at all , a bad row (an NDJSON line that is not json or a post that fails the validation)
+# is reported against its own index and nothing is written
+def validate_and_insert_posts(db : Session , author_id : int , items : list) -> list:
+    errors = {i : [{"type" : "json_invalid" , "msg" : str(item)}] for i , item in enumerate(items) if isinstance(item , ValueError)}
+    candidates = [i for i in range(len(items)) if i not in errors]
+    try:
+        posts = PostsList.validate_python([items[i] for i in candidates])
+    except ValidationError as e:
+        for error in e.errors(include_url=False , include_context=False):
+            errors.setdefault(candidates[error["loc"][0]] , []).append({**error , "loc" : error["loc"][1:]})
+    if errors:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY ,
+            detail=[{"index" : i , "errors" : errors[i]} for i in sorted(errors)]
+        )
+    return insert_posts(db , author_id , posts)
+
+
+@app.post("/uploadPosts/bulk" , status_code=status.HTTP_201_CREATED)
+async def upload_posts_bulk(request : Request , user : Principal = Depends(get_current_user) , db : Session = Depends(get_db)):
+    items = parse_records(await request.body() , request.headers.get("content-type" , "") , "posts")
+    if not items:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST , detail="no posts to upload")
+    if len(items) > MAX_BULK_POSTS:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE , detail=f"at most {MAX_BULK_POSTS} posts per request")
+
+    # validating thousands of posts is cpu work , it runs in the threadpool together with the insert so other requests are not blocked
+    # like /uploadPost the posts always belong to the logged in author
+    ids = await run_in_threadpool(validate_and_insert_posts , db , user.id , items)
+    return {
+        "message" : f"{len(ids)} posts uploaded successfully" ,
+        "ids" : ids
+    }
     
 
-@app.get("/myPosts")
-def get_all_posts(author : AuthorM = Depends(get_current_user) , db : Session = Depends(get_db)):
-    posts = db.query(Post).filter(author.id == Post.author_id).all()
-    return posts
+# keyset pagination , every page continues after the last post id of the previous one (the X-Next-Cursor header)
+# so with the (author_id , id) index each page costs the same no matter how many posts the author has
+# only the needed columns are selected , no ORM objects are built
+# format=ndjson streams all of the author's posts one json object per line
+@app.get("/myPosts", response_model=list[PostOut])
+async def get_all_posts(
+    after_id : Optional[int] = None ,
+    limit : int = Query(50 , ge=1 , le=500) ,
+    format : Literal["json" , "ndjson"] = "json" ,
+    author : Principal = Depends(get_current_user) ,
+    db = Depends(get_read_session)
+):
+    query = select(Post.id , Post.author_id , Post.content).where(Post.author_id == author.id)
+    if after_id is not None:
+        query = query.where(Post.id > after_id)
+    query = query.order_by(Post.id)
 
-     
+    if format == "ndjson":
+        # the stream outlives the request's session , so it reads through its own
+        if DB_ASYNC:
+            async def lines():
+                async with AsyncReadSessionLocal() as stream_db:
+                    async for row in await stream_db.stream(query.execution_options(yield_per=1000)):
+                        yield orjson.dumps(row._asdict()) + b"\n"
+        else:
+            def lines():
+                with ReadSessionLocal() as stream_db:
+                    for row in stream_db.execute(query.execution_options(yield_per=1000)):
+                        yield orjson.dumps(row._asdict()) + b"\n"
+        return StreamingResponse(lines() , media_type="application/x-ndjson")
 
+    rows = await run_db(db , lambda session : session.execute(query.limit(limit + 1)).all())
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = str(rows[-1].id)
+    return model_response(PostOutList , rows , headers)
 
 
+# both are served from the denormalized posts_count , no COUNT(*) over the posts table
+@app.get("/authors/leaderboard" , response_model=list[AuthorStats])
+def authors_leaderboard(limit : int = Query(10 , ge=1 , le=100) , db : Session = Depends(get_read_db)):
+    rows = db.execute(
+        select(AuthorM.id , AuthorM.name , AuthorM.posts_count)
+        .order_by(AuthorM.posts_count.desc() , AuthorM.id.desc())
+        .limit(limit)
+    ).all()
+    return model_response(AuthorStatsList , rows)
 
 
+@app.get("/authors/{author_id}/stats" , response_model=AuthorStats)
+def author_stats(author_id : int , db : Session = Depends(get_read_db)):
+    row = db.execute(
+        select(AuthorM.id , AuthorM.name , AuthorM.posts_count).where(AuthorM.id == author_id)
+    ).first()
+    if row is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND , detail="author not found")
+    return row._asdict()
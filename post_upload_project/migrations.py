@@ -0,0 +1,43 @@
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+from .db import Base , engine
+from .models import AuthorM , Post , RefreshToken
+from .counters import reconcile_posts_count
+
+# create_all only creates the tables that are missing , it never changes a table that already exists
+# so a database made before the refresh token rework and the new indexes is brought up to date here
+# every step looks at the live schema first , running it again (or on a brand new database) changes nothing
+
+
+def migrate(bind=engine) -> list:
+    applied = []
+    Base.metadata.create_all(bind=bind)
+
+    # the old refresh_tokens kept a salted bcrypt hash of every token and had no jti , those rows can never be looked up by digest
+    # so the table is rebuilt with the new columns , whoever held one of the old refresh tokens has to log in again
+    columns = {c["name"] for c in inspect(bind).get_columns(RefreshToken.__tablename__)}
+    if "jti" not in columns:
+        RefreshToken.__table__.drop(bind)
+        RefreshToken.__table__.create(bind)
+        applied.append("rebuilt refresh_tokens with the jti and digest columns")
+
+    backfill_posts_count = False
+    for table in (AuthorM.__table__ , Post.__table__ , RefreshToken.__table__):
+        existing = {i["name"] for i in inspect(bind).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind)
+                applied.append(f"created index {index.name}")
+                backfill_posts_count = backfill_posts_count or index.name == "ix_authors_posts_count_id"
+
+    # posts_count was not kept up to date before the leaderboard index came in , it is filled in once together with that index
+    if backfill_posts_count:
+        with Session(bind) as db:
+            applied.append(f"posts_count backfilled for {reconcile_posts_count(db)} authors")
+    return applied
+
+
+# python -m post_upload_project.migrations
+if __name__ == "__main__":
+    steps = migrate()
+    print("\n".join(steps) if steps else "the database is up to date")
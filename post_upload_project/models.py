@@ -1,7 +1,7 @@
 from sqlalchemy.orm import Mapped , mapped_column , relationship
-from sqlalchemy import ForeignKey
-from typing import List
-from db import Base
+from sqlalchemy import ForeignKey , Index
+from typing import List , Optional
+from .db import Base
 from datetime import datetime , timedelta
 
 """ UNDERSTANDING THE RELATIONSHIPS"""
@@ -11,10 +11,12 @@ from datetime import datetime , timedelta
 class AuthorM(Base):
 
     __tablename__ = "authors"
+    # the leaderboard reads the top authors straight from this index
+    __table_args__ = (Index("ix_authors_posts_count_id", "posts_count", "id"),)
 
     id: Mapped[int] = mapped_column(primary_key=True)
     name : Mapped[str] = mapped_column(nullable=False, unique=True)
-    email : Mapped[str] = mapped_column()
+    email : Mapped[str] = mapped_column(index=True)     # login looks authors up by email
     password : Mapped[str] = mapped_column()
     posts_count :Mapped[int] = mapped_column(default=0 , server_default='0')
 
@@ -24,6 +26,8 @@ class AuthorM(Base):
 class Post(Base):
 
     __tablename__ = "posts"
+    # an author's posts in id order straight from the index , used by the keyset pagination of /myPosts
+    __table_args__ = (Index("ix_posts_author_id_id", "author_id", "id"),)
 
     id : Mapped[int] = mapped_column(primary_key=True)
     author_id : Mapped[int] = mapped_column(ForeignKey("authors.id"))
@@ -36,10 +40,13 @@ class RefreshToken(Base):
     __tablename__ = "refresh_tokens"
 
     id : Mapped[int] = mapped_column(primary_key=True)
-    token :Mapped[str] = mapped_column(unique=True , nullable=False)
-    user_id : Mapped[int] = mapped_column(ForeignKey("authors.id") , nullable=False)
-    created_at :Mapped[int] = mapped_column(nullable=False)
-    expires_at :Mapped[int] = mapped_column(nullable=False)
+    jti : Mapped[str] = mapped_column(unique=True , nullable=False)      # the token is looked up by its id , the unique index makes that one index seek
+    token :Mapped[str] = mapped_column(unique=True , nullable=False)    # HMAC-SHA256 digest of the token , never the token itself
+    user_id : Mapped[int] = mapped_column(ForeignKey("authors.id") , nullable=False , index=True)
+    created_at :Mapped[int] = mapped_column(nullable=False)             # unix timestamps
+    expires_at :Mapped[int] = mapped_column(nullable=False , index=True)  # indexed so expired tokens can be deleted without a full scan
+    revoked_at :Mapped[Optional[int]] = mapped_column(nullable=True)    # set when the token is rotated or revoked
+    replaced_by :Mapped[Optional[str]] = mapped_column(nullable=True)   # jti of the token it was rotated into
 
     user = relationship("AuthorM" , back_populates="refresh_tokens")
 
@@ -0,0 +1,80 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from sqlalchemy import event
+from .models import AuthorM
+
+# how long a resolved author is trusted without asking the database again , and how many are kept per process
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+
+
+# the logged in author as the endpoints need it , a plain object and not an ORM instance
+# so it can be shared between requests and sessions safely
+@dataclass(frozen=True)
+class Principal:
+    id: int
+    name: str
+    email: str
+
+    @classmethod
+    def from_author(cls, author: AuthorM) -> "Principal":
+        return cls(id=author.id, name=author.name, email=author.email)
+
+
+class PrincipalCache:
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.entries = OrderedDict()       # author id -> (expires at , principal)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, author_id: int):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(author_id)
+            if entry is None or entry[0] < now:
+                self.entries.pop(author_id, None)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(author_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, principal: Principal):
+        with self.lock:
+            self.entries[principal.id] = (time.monotonic() + self.ttl, principal)
+            self.entries.move_to_end(principal.id)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, author_id: int):
+        with self.lock:
+            self.entries.pop(author_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL_SECONDS)
+
+
+def invalidate_principal(author_id: int):
+    principal_cache.invalidate(author_id)
+
+
+# any change to an author through the ORM (a new password , a new email , deleting the account) drops the cached copy
+# other worker processes still keep theirs until the TTL runs out
+@event.listens_for(AuthorM, "after_update")
+@event.listens_for(AuthorM, "after_delete")
+def _drop_cached_author(mapper, connection, target):
+    invalidate_principal(target.id)
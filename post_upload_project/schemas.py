@@ -1,4 +1,5 @@
-from pydantic import BaseModel , EmailStr , Field
+from fastapi.responses import Response
+from pydantic import BaseModel , EmailStr , Field , TypeAdapter
 
 class AuthorS(BaseModel):
     name : str
@@ -12,4 +13,26 @@ class Posts(BaseModel):
 
 class  Login(BaseModel):
     email : EmailStr
-    password : str
\ No newline at end of file
+    password : str
+
+class RefreshRequest(BaseModel):
+    refresh_token : str
+
+class PostOut(BaseModel):
+    id : int
+    author_id : int
+    content : str
+
+class AuthorStats(BaseModel):
+    id : int
+    name : str
+    posts_count : int
+
+PostOutList = TypeAdapter(list[PostOut])
+AuthorStatsList = TypeAdapter(list[AuthorStats])
+
+# for the list endpoints : the rows are validated straight from their attributes and written to json bytes by pydantic-core ,
+# FastAPI would validate them , turn them back into python dicts and only then encode those
+def model_response(adapter : TypeAdapter , rows , headers : dict = None) -> Response:
+    body = adapter.dump_json(adapter.validate_python(rows , from_attributes=True))
+    return Response(content=body , media_type="application/json" , headers=headers)
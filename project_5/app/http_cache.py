@@ -0,0 +1,61 @@
+import hashlib
+import orjson
+from fastapi import Request
+from fastapi.responses import ORJSONResponse, Response
+
+# conditional GET : every cacheable response carries an ETag (a fingerprint of the body) , a client that already has the body
+# sends it back in If-None-Match and gets an empty 304 Not Modified instead of the whole body again
+
+# the headers a 304 has to repeat from the 200 it stands for
+NOT_MODIFIED_HEADERS = ("cache-control", "etag", "vary", "expires", "last-modified", "content-location")
+
+
+def strong_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+# an ETag from something that changes whenever the data changes (an id and a version number , an updated_at ...)
+# so the body does not have to be built and serialized just to find out that the client already has it
+def version_etag(*parts) -> str:
+    return strong_etag("/".join(str(p) for p in parts).encode())
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match uses the weak comparison , W/"x" and "x" are the same , and * matches anything
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    wanted = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == wanted for tag in if_none_match.split(","))
+
+
+def cache_headers(etag: str, max_age: int = 3600, public: bool = True, vary: str = "Accept, Accept-Encoding") -> dict:
+    return {
+        "ETag": etag,
+        "Cache-Control": f"{'public' if public else 'private'}, max-age={max_age}",
+        "Vary": vary,
+    }
+
+
+def not_modified(headers) -> Response:
+    return Response(status_code=304, headers={k: v for k, v in headers.items() if k.lower() in NOT_MODIFIED_HEADERS})
+
+
+def check_not_modified(request: Request, etag: str, **cache_options):
+    # for the version key way , call this before building the body , a 304 comes back when the client is up to date
+    if request.method in ("GET", "HEAD") and etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(cache_headers(etag, **cache_options))
+    return None
+
+
+def cached_json(request: Request, content, etag: str = None, headers: dict = None, **cache_options) -> Response:
+    # serializes once , the ETag is taken from exactly the bytes that would be sent
+    # written with orjson like the rest of the app's responses
+    body = orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    etag = etag or strong_etag(body)
+    all_headers = {**(headers or {}), **cache_headers(etag, **cache_options)}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(all_headers)
+    return Response(content=body, media_type=ORJSONResponse.media_type, headers=all_headers)
+
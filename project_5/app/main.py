@@ -1,21 +1,36 @@
-from fastapi import FastAPI , status
-from fastapi.responses import JSONResponse
+# started from the repo root :  uvicorn project_5.app.main:app --reload
+from fastapi import FastAPI , Request , status
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
+from .http_cache import cached_json , check_not_modified , version_etag
+from common.response_cache import ResponseCache
 
-app=FastAPI()
+app=FastAPI(default_response_class=ORJSONResponse)
+
+# the serialized user responses are kept in memory , a burst of requests for the same user runs the handler once
+response_cache = ResponseCache()
+
+# bump this (and call response_cache.invalidate) whenever the user data changes , the ETag of /users/{user_id} is made from it so a repeat
+# request with a matching If-None-Match gets a 304 before the body is even built
+USERS_VERSION = 1
 
 @app.get("/users/{user_id}")
-def user_detail(user_id:int):
+@response_cache.cached(ttl=60 , tags=("user:{user_id}",))
+def user_detail(user_id:int , request : Request):
     if user_id == 101:
+        etag = version_etag("user" , user_id , USERS_VERSION)
+        unchanged = check_not_modified(request , etag , max_age=3600)
+        if unchanged is not None:
+            return unchanged
         content={"user_id":user_id,"user_name":"usman"}
-        header={"Cache-Control":"public,max_age=3600"}
-        return JSONResponse (content=content , status_code=status.HTTP_200_OK, headers=header)
+        return cached_json (request , content , etag=etag , max_age=3600)
     
-@app.get("/users/{user_id}/{city}", response_class=JSONResponse)
-def get_user_by_user_id__and_city(user_id:int,city:str) -> JSONResponse:
+# the ETag here is taken from the serialized body , a 304 still saves sending it
+@app.get("/users/{user_id}/{city}", response_class=ORJSONResponse)
+def get_user_by_user_id__and_city(user_id:int,city:str , request : Request) -> ORJSONResponse:
     content = {"name":"khan","city":city , "user_id":user_id}
-    header = {"response type":"json", "made by ": "fastapi web application" , "Cached-Control":"public ,max_age=3600"}
-    return JSONResponse (content=content , headers=header , status_code=status.HTTP_200_OK)
+    header = {"X-Response-Type":"json", "X-Made-By": "fastapi web application"}
+    return cached_json (request , content , headers=header , max_age=3600)
 
 # this is the wrong aproach , for the post requests , always use the proper pydanctic model schemas
 # @app.post("/users/create", response_class=JSONResponse)
@@ -40,8 +55,12 @@ def create_user(user : UserCreate):
     header = {
         "Cache-Control":"no-cache",
     }
-    return JSONResponse (
+    return ORJSONResponse (
         headers= header ,
         content=content ,
         status_code=status.HTTP_201_CREATED
-    )
\ No newline at end of file
+    )
+
+@app.get("/cache/stats")
+def cache_stats():
+    return response_cache.stats()
@@ -0,0 +1,182 @@
+import threading
+from collections import defaultdict
+
+
+class StudentExists(Exception):
+    pass
+
+
+class StudentNotFound(Exception):
+    pass
+
+
+# substring search without scanning every value , each lowercased value is broken into all of its 1 , 2 and 3 letter pieces (n-grams)
+# a query can only match a value that contains all of the query's 3 letter pieces , so only those few candidates are checked
+class NgramIndex:
+    N = 3
+
+    def __init__(self):
+        self.postings = defaultdict(set)      # n-gram -> keys of the values that contain it
+        self.values = {}                      # key -> lowercased value
+
+    @classmethod
+    def grams(cls, text: str, n: int) -> set:
+        return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+    def add(self, key, value: str):
+        text = value.lower()
+        self.values[key] = text
+        for n in range(1, self.N + 1):
+            for gram in self.grams(text, n):
+                self.postings[gram].add(key)
+
+    def remove(self, key):
+        text = self.values.pop(key, None)
+        if text is None:
+            return
+        for n in range(1, self.N + 1):
+            for gram in self.grams(text, n):
+                keys = self.postings[gram]
+                keys.discard(key)
+                if not keys:
+                    del self.postings[gram]
+
+    def search(self, query: str) -> set:
+        query = query.lower()
+        if len(query) <= self.N:
+            # short queries are n-grams themselves , the posting set is the exact answer
+            return set(self.postings.get(query, ()))
+
+        posting_sets = sorted((self.postings.get(g, set()) for g in self.grams(query, self.N)), key=len)
+        candidates = set(posting_sets[0])
+        for keys in posting_sets[1:]:
+            candidates &= keys
+            if not candidates:
+                return candidates
+        return {key for key in candidates if query in self.values[key]}
+
+
+# the in memory students with indexes that are kept in step on every add and update
+# id lookups are one dict access , grade is an exact match index and name and city are substring (n-gram) indexes
+# every student gets a position number when it is added , results are returned in that order like the old list was
+class StudentStore:
+
+    def __init__(self, students=()):
+        self.lock = threading.RLock()
+        self.rows = {}                         # position -> student
+        self.position_of = {}                  # student id -> position
+        self.by_grade = defaultdict(set)       # upper case grade -> positions
+        self.names = NgramIndex()
+        self.cities = NgramIndex()
+        self.next_position = 0
+        for student in students:
+            self.add(student)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, student_id):
+        return student_id in self.position_of
+
+    def get(self, student_id):
+        with self.lock:
+            position = self.position_of.get(student_id)
+            return self.rows[position] if position is not None else None
+
+    def add(self, student: dict) -> dict:
+        with self.lock:
+            if student["id"] in self.position_of:
+                raise StudentExists(student["id"])
+            position = self.next_position
+            self.next_position += 1
+            self._index(position, student)
+            return student
+
+    def update(self, student_id, student: dict) -> dict:
+        with self.lock:
+            position = self.position_of.get(student_id)
+            if position is None:
+                raise StudentNotFound(student_id)
+            if student["id"] != student_id and student["id"] in self.position_of:
+                raise StudentExists(student["id"])
+            self._unindex(position)
+            self._index(position, student)
+            return student
+
+    def bulk_put(self, students: list, upsert: bool = False) -> list:
+        # all or nothing , every id is checked before anything is changed and it all happens under one lock
+        with self.lock:
+            if not upsert:
+                for student in students:
+                    if student["id"] in self.position_of:
+                        raise StudentExists(student["id"])
+
+            outcomes = []
+            for student in students:
+                position = self.position_of.get(student["id"])
+                if position is None:
+                    position = self.next_position
+                    self.next_position += 1
+                    outcomes.append("created")
+                else:
+                    self._unindex(position)
+                    outcomes.append("updated")
+                self._index(position, student)
+            return outcomes
+
+    def filter(self, name=None, city=None, grade=None) -> list:
+        return [student for _, student in self.iter_filtered(name, city, grade)]
+
+    def iter_filtered(self, name=None, city=None, grade=None, after: int = -1):
+        # yields (position , student) in roster order for the students after the given position
+        # without filters it walks the positions one by one so nothing is copied , students added meanwhile are picked up too
+        if not (name or city or grade):
+            position = after + 1
+            while position < self.next_position:
+                student = self.rows.get(position)
+                if student is not None:
+                    yield position, student
+                position += 1
+            return
+
+        with self.lock:
+            positions = sorted(p for p in self._matching(name, city, grade) if p > after)
+        for position in positions:
+            student = self.rows.get(position)
+            if student is not None:
+                yield position, student
+
+    def _matching(self, name, city, grade) -> set:
+        matches = []
+        if grade:
+            matches.append(self.by_grade.get(grade.upper(), set()))
+        if name:
+            matches.append(self.names.search(name))
+        if city:
+            matches.append(self.cities.search(city))
+
+        matches.sort(key=len)
+        positions = set(matches[0])
+        for other in matches[1:]:
+            positions &= other
+        return positions
+
+    def _index(self, position, student):
+        self.rows[position] = student
+        self.position_of[student["id"]] = position
+        if student.get("grade"):
+            self.by_grade[student["grade"].upper()].add(position)
+        self.names.add(position, student["name"])
+        self.cities.add(position, student["city"])
+
+    def _unindex(self, position):
+        # the row itself stays , _index overwrites it in place so the students keep their order
+        student = self.rows[position]
+        del self.position_of[student["id"]]
+        if student.get("grade"):
+            grade = student["grade"].upper()
+            self.by_grade[grade].discard(position)
+            if not self.by_grade[grade]:
+                del self.by_grade[grade]
+        self.names.remove(position)
+        self.cities.remove(position)
@@ -0,0 +1,79 @@
+import pickle
+from pathlib import Path
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("sklearn")
+
+from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import LinearRegression
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from sklearn.tree import DecisionTreeRegressor
+from models.fast_path import build_fast_path
+from models.predict import FEATURES, LOCATIONS
+
+MODEL_DIR = Path(__file__).resolve().parents[1] / "models"
+NUMERIC = [f for f in FEATURES if f != "location"]
+
+
+def random_records(n: int, seed: int) -> list:
+    # the valid api ranges and well outside them , the fast path has to agree everywhere
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            "area": int(rng.integers(0, 10_000)),
+            "bedrooms": int(rng.integers(0, 12)),
+            "location": LOCATIONS[int(rng.integers(len(LOCATIONS)))],
+            "age": int(rng.integers(0, 120)),
+        }
+        for _ in range(n)
+    ]
+
+
+def pandas_predictions(model, records: list) -> np.ndarray:
+    return model.predict(pd.DataFrame(records, columns=FEATURES))
+
+
+def trained_pipeline(regressor):
+    # the same layout as the shipped model , trained on synthetic houses
+    rng = np.random.default_rng(1)
+    records = random_records(500, seed=2)
+    frame = pd.DataFrame(records, columns=FEATURES)
+    target = 150 * frame["area"] + 9000 * frame["bedrooms"] - 800 * frame["age"] + rng.normal(0, 1000, len(frame))
+    preprocessor = ColumnTransformer([
+        ("num", Pipeline([("imputer", SimpleImputer()), ("scaler", StandardScaler())]), NUMERIC),
+        ("cat", Pipeline([("imputer", SimpleImputer(strategy="most_frequent")), ("onehot", OneHotEncoder(handle_unknown="ignore"))]), ["location"]),
+    ])
+    return Pipeline([("preprocessor", preprocessor), ("regressor", regressor)]).fit(frame, target)
+
+
+def shipped_models() -> list:
+    paths = sorted(MODEL_DIR.glob("*.pkl"))
+    models = []
+    for path in paths:
+        with open(path, "rb") as f:
+            models.append(pytest.param(pickle.load(f), id=path.name))
+    return models
+
+
+@pytest.mark.parametrize("model", shipped_models() + [pytest.param(trained_pipeline(LinearRegression()), id="synthetic")])
+def test_fast_path_matches_pandas_path(model):
+    fast = build_fast_path(model, FEATURES, LOCATIONS)
+    assert fast is not None
+
+    records = random_records(2000, seed=42)
+    expected = pandas_predictions(model, records)
+    rows = [SimpleNamespace(**record) for record in records]
+
+    np.testing.assert_allclose(fast.predict_many(rows), expected, rtol=1e-9, atol=1e-6)
+    np.testing.assert_allclose([fast.predict_one(row) for row in rows], expected, rtol=1e-9, atol=1e-6)
+    columns = {f: [record[f] for record in records] for f in FEATURES}
+    np.testing.assert_allclose(fast.predict_columns(columns), expected, rtol=1e-9, atol=1e-6)
+
+
+def test_non_linear_model_keeps_the_pandas_path():
+    assert build_fast_path(trained_pipeline(DecisionTreeRegressor(random_state=0)), FEATURES, LOCATIONS) is None